@@ -1,9 +1,117 @@
 from django.contrib import admin
-from .models import Category, Product, Supplier, Stock, PurchaseItem, SaleItem
-
-admin.site.register(Category)
-admin.site.register(Product)
-admin.site.register(Supplier)
-admin.site.register(Stock)
-admin.site.register(PurchaseItem)
-admin.site.register(SaleItem)
\ No newline at end of file
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import OuterRef, Subquery, Sum
+from django.utils.functional import cached_property
+from .models import Category, Product, Supplier, Stock, StockShard, PurchaseItem, SaleItem
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that reads the row count of an unfiltered changelist from the
+    database statistics instead of running an exact COUNT(*) over the table.
+    """
+    # Below this many rows an exact count is cheap enough
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        if not query.where:
+            estimate = self.estimate_rows(self.object_list.db, self.object_list.model._meta.db_table)
+            if estimate is not None and estimate > self.exact_count_limit:
+                return estimate
+        return super().count
+
+    def estimate_rows(self, alias, table):
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            elif connection.vendor == 'mysql':
+                cursor.execute(
+                    "SELECT table_rows FROM information_schema.tables "
+                    "WHERE table_schema = DATABASE() AND table_name = %s", [table])
+            else:
+                return None
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    """
+    Base admin for large tables: estimated counts and no second count of
+    the unfiltered table on filtered changelists.
+
+    Subclasses filter dates with `list_filter` (ranges on an indexed column)
+    rather than `date_hierarchy`, whose year links run a DISTINCT over the
+    truncated dates of the whole table.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ['category_name', 'description']
+    search_fields = ['category_name']
+    ordering = ['category_name']
+
+
+@admin.register(Product)
+class ProductAdmin(ScalableModelAdmin):
+    list_display = ['product_name', 'category', 'price', 'is_active', 'created_by', 'created_at']
+    list_select_related = ['category', 'created_by']
+    list_filter = ['is_active', 'created_at']
+    search_fields = ['product_name']
+    ordering = ['-created_at']
+    autocomplete_fields = ['category']
+    raw_id_fields = ['created_by']
+
+
+@admin.register(Supplier)
+class SupplierAdmin(admin.ModelAdmin):
+    list_display = ['supplier_name', 'supplier_email', 'phone_number']
+    search_fields = ['supplier_name', 'supplier_email']
+    ordering = ['supplier_name']
+
+
+@admin.register(Stock)
+class StockAdmin(ScalableModelAdmin):
+    list_display = ['name', 'current_quantity', 'sharded', 'last_updated']
+    search_fields = ['name']
+    ordering = ['name']
+
+    def get_queryset(self, request):
+        # Live total of sharded stocks, summed per displayed row only
+        shard_total = (
+            StockShard.objects.filter(stock=OuterRef('pk'))
+            .values('stock').annotate(total=Sum('quantity')).values('total')
+        )
+        return super().get_queryset(request).annotate(shard_total=Subquery(shard_total))
+
+    @admin.display(description='quantity', ordering='quantity')
+    def current_quantity(self, stock):
+        # `quantity` of a sharded stock is only the last compaction's snapshot
+        if stock.sharded:
+            return stock.shard_total or 0
+        return stock.quantity
+
+
+@admin.register(PurchaseItem)
+class PurchaseItemAdmin(ScalableModelAdmin):
+    list_display = ['purchase_id', 'stock', 'supplier', 'quantity', 'perprice', 'totalprice', 'date']
+    list_select_related = ['stock', 'supplier']
+    list_filter = ['date']
+    ordering = ['-date']
+    autocomplete_fields = ['stock', 'supplier']
+
+
+@admin.register(SaleItem)
+class SaleItemAdmin(ScalableModelAdmin):
+    list_display = ['sale_id', 'stock', 'quantity', 'perprice', 'discount', 'totalprice', 'date']
+    list_select_related = ['stock']
+    list_filter = ['date']
+    ordering = ['-date']
+    autocomplete_fields = ['stock']
@@ -0,0 +1,81 @@
+# Moves aged purchase and sale history out of the hot tables
+from heapq import merge
+
+from django.db import router, transaction
+
+from .models import ArchivedPurchaseItem, ArchivedSaleItem, PurchaseItem, SaleItem
+
+# Hot model -> archive model pairs handled by the archiver
+ARCHIVED_MODELS = {
+    PurchaseItem: ArchivedPurchaseItem,
+    SaleItem: ArchivedSaleItem,
+}
+
+
+def archive_rows(model, cutoff, batch_size=1000, progress=None):
+    """
+    Move rows of `model` dated before `cutoff` into its archive table.
+
+    Rows are moved oldest first in batches, each committed on its own, so an
+    interrupted run simply continues where it stopped the next time it is
+    started. Stock quantities are not touched. Returns the number of rows moved.
+    """
+    archive_model = ARCHIVED_MODELS[model]
+    fields = [field.attname for field in model._meta.concrete_fields]
+    pk_name = model._meta.pk.attname
+    hot_db = router.db_for_write(model)
+    cold_db = router.db_for_write(archive_model)
+
+    moved = 0
+    while True:
+        rows = list(
+            model.objects.using(hot_db)
+            .filter(date__lt=cutoff)
+            .order_by('date', pk_name)
+            .values(*fields)[:batch_size]
+        )
+        if not rows:
+            break
+
+        # When the archive is a separate database the copy is committed
+        # before the delete: the inner (archive) block commits first, and
+        # if that fails the outer block rolls the delete back. ignore_conflicts
+        # makes a repeated copy after a crash in between harmless.
+        with transaction.atomic(using=hot_db), transaction.atomic(using=cold_db):
+            archive_model.objects.using(cold_db).bulk_create(
+                [archive_model(**row) for row in rows], ignore_conflicts=True)
+            model.objects.using(hot_db).filter(
+                pk__in=[row[pk_name] for row in rows]).delete()
+
+        moved += len(rows)
+        if progress is not None:
+            progress(model, moved)
+    return moved
+
+
+class MergedHistory:
+    """
+    Read-only sequence of hot and archived rows ordered by `-date`.
+
+    Supports `count()` and slicing, which is all a paginator needs. A slice
+    only fetches the newest `stop` rows of each table.
+    """
+
+    def __init__(self, queryset, archived_queryset):
+        self.queryset = queryset.order_by('-date')
+        self.archived_queryset = archived_queryset.order_by('-date')
+
+    def count(self):
+        return self.queryset.count() + self.archived_queryset.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if isinstance(index, int):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        hot = self.queryset[:stop] if stop is not None else self.queryset
+        cold = self.archived_queryset[:stop] if stop is not None else self.archived_queryset
+        rows = merge(hot, cold, key=lambda row: row.date, reverse=True)
+        return list(rows)[start:stop]
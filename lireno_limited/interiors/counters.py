@@ -0,0 +1,180 @@
+# Stock quantity movements, with an optional sharded mode for hot stocks
+import random
+from decimal import ROUND_DOWN, Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, Sum
+
+from .models import Stock, StockShard, SyncChange
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when a checked movement would take a stock below zero.
+    """
+
+    def __init__(self, available):
+        super().__init__(f"Only {available} available.")
+        self.available = available
+
+
+def shard_count():
+    return getattr(settings, 'STOCK_COUNTER_SHARDS', 8)
+
+
+def stock_level(stock):
+    """
+    Return the current quantity of `stock`, summing its shards if it has any.
+    """
+    if not stock.sharded:
+        return stock.quantity
+    total = StockShard.objects.filter(stock=stock).aggregate(total=Sum('quantity'))['total']
+    return total or Decimal(0)
+
+
+def move_stock(stock, delta, check_available=False):
+    """
+    Add `delta` (negative to take away) to the quantity of `stock`.
+
+    With `check_available` the movement is refused with `InsufficientStock`
+    if it would leave less than zero. Unsharded stocks are updated and saved
+    through the instance as before. Sharded stocks never touch the `Stock`
+    row: the movement lands on one of the shard rows, so concurrent
+    movements of the same stock mostly lock different rows.
+    """
+    delta = Decimal(delta)
+    if not stock.sharded:
+        if check_available and stock.quantity + delta < 0:
+            raise InsufficientStock(stock.quantity)
+        stock.quantity += delta
+        stock.save()
+        return
+
+    _move_shards(stock, delta, check_available)
+    # The `Stock` row is not saved, so publish the change to the delta-sync
+    # feeds here. Appending leaves no row for concurrent movements to wait
+    # on; the feeds only return the latest entry of each stock, and the
+    # older ones are pruned when the stock is next compacted.
+    SyncChange.record(Stock, [stock.pk], replace=False)
+
+
+def _move_shards(stock, delta, check_available):
+    # The shards that exist, whatever STOCK_COUNTER_SHARDS says now
+    shards = list(range(stock.shard_count))
+    random.shuffle(shards)
+
+    if delta >= 0:
+        # Any shard can take an addition
+        if shards and StockShard.objects.filter(stock=stock, shard=shards[0]).update(
+                quantity=F('quantity') + delta):
+            return
+    else:
+        # Take from the first shard that holds enough. The condition in the
+        # UPDATE keeps check and decrement atomic without locking other rows;
+        # a shard left negative by an unchecked movement means the total may
+        # be smaller than any one shard, so then only the locking path is safe.
+        in_debt = StockShard.objects.filter(stock=stock, quantity__lt=0)
+        for shard in shards:
+            if StockShard.objects.filter(stock=stock, shard=shard, quantity__gte=-delta).exclude(
+                    Exists(in_debt)).update(quantity=F('quantity') + delta):
+                return
+
+    # No single shard holds enough, or the chosen one is missing: lock them
+    # all and move the quantity across shards
+    with transaction.atomic():
+        locked = list(StockShard.objects.select_for_update().filter(stock=stock).order_by('shard'))
+        if not locked:
+            raise StockShard.DoesNotExist(f"Stock {stock.pk} is marked sharded but has no shards.")
+        total = sum((shard.quantity for shard in locked), Decimal(0))
+        if check_available and total + delta < 0:
+            raise InsufficientStock(total)
+        for shard, quantity in zip(locked, split_evenly(total + delta, len(locked))):
+            shard.quantity = quantity
+        StockShard.objects.bulk_update(locked, ['quantity'])
+
+
+def split_evenly(total, count):
+    """
+    Split `total` into `count` parts of whole cents; the first takes the
+    remainder, or all of it when `total` is negative.
+    """
+    if total < 0:
+        return [total] + [Decimal(0)] * (count - 1)
+    share = (total / count).quantize(Decimal('0.01'), rounding=ROUND_DOWN)
+    return [total - share * (count - 1)] + [share] * (count - 1)
+
+
+def _rebalance(stock, total=None):
+    """
+    Lock the shards of `stock` and spread `total` (by default, what they
+    hold between them) evenly over them. Returns the total.
+    """
+    shards = list(StockShard.objects.select_for_update().filter(stock=stock).order_by('shard'))
+    if total is None:
+        total = sum((shard.quantity for shard in shards), Decimal(0))
+    for shard, quantity in zip(shards, split_evenly(total, len(shards))):
+        shard.quantity = quantity
+    StockShard.objects.bulk_update(shards, ['quantity'])
+    return total
+
+
+def enable_sharding(stock, count=None):
+    """
+    Move the quantity of `stock` onto `count` shards.
+    """
+    count = count or shard_count()
+    with transaction.atomic():
+        stock = Stock.objects.select_for_update().get(pk=stock.pk)
+        if stock.sharded:
+            return stock
+        StockShard.objects.filter(stock=stock).delete()
+        StockShard.objects.bulk_create([
+            StockShard(stock=stock, shard=index, quantity=quantity)
+            for index, quantity in enumerate(split_evenly(stock.quantity, count))
+        ])
+        stock.sharded = True
+        stock.shard_count = count
+        stock.save()
+    return stock
+
+
+def disable_sharding(stock):
+    """
+    Fold the shards of `stock` back into its own `quantity`.
+    """
+    with transaction.atomic():
+        stock = Stock.objects.select_for_update().get(pk=stock.pk)
+        if not stock.sharded:
+            return stock
+        shards = list(StockShard.objects.select_for_update().filter(stock=stock))
+        stock.quantity = sum((shard.quantity for shard in shards), Decimal(0))
+        StockShard.objects.filter(stock=stock).delete()
+        stock.sharded = False
+        stock.shard_count = 0
+        stock.save()
+    return stock
+
+
+def compact_stock(stock):
+    """
+    Rebalance the shards of `stock` evenly and refresh its `quantity` snapshot.
+
+    Sales take from one shard at a time, so shards drift apart and more
+    sales fall through to the locking path; compaction evens them out.
+    """
+    with transaction.atomic():
+        stock = Stock.objects.select_for_update().get(pk=stock.pk)
+        if not stock.sharded:
+            return stock
+        stock.quantity = _rebalance(stock)
+        stock.save()
+    return stock
+
+
+def set_stock_level(stock, quantity):
+    """
+    Set the quantity of a sharded `stock` outright, as an edit of the stock does.
+    """
+    with transaction.atomic():
+        _rebalance(stock, Decimal(quantity))
@@ -0,0 +1,120 @@
+# In-process broadcast of live stock-level changes to SSE subscribers
+import asyncio
+import threading
+from collections import OrderedDict
+
+from django.db import transaction
+
+from .counters import stock_level
+
+
+class StockSubscription:
+    """
+    One subscriber's pending events, owned by the event loop serving it.
+
+    Events are coalesced per stock, so a slow subscriber only ever receives
+    the latest level of each stock and never holds more than `max_pending`
+    stocks worth of events; beyond that the oldest are dropped.
+    """
+
+    def __init__(self, hub, loop, stock_ids=None, max_pending=1000):
+        self.hub = hub
+        self.loop = loop
+        self.stock_ids = set(stock_ids) if stock_ids else None
+        self.max_pending = max_pending
+        self.pending = OrderedDict()
+        self.dropped = 0
+        self.wakeup = asyncio.Event()
+
+    def wants(self, event):
+        return self.stock_ids is None or event['stock_id'] in self.stock_ids
+
+    def push(self, event):
+        # Only ever called on `self.loop`
+        stock_id = event['stock_id']
+        self.pending.pop(stock_id, None)
+        self.pending[stock_id] = event
+        if len(self.pending) > self.max_pending:
+            self.pending.popitem(last=False)
+            self.dropped += 1
+        self.wakeup.set()
+
+    async def next_events(self, timeout=None):
+        """
+        Wait for events and return all pending ones, or [] after `timeout` seconds.
+        """
+        if not self.pending:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        self.wakeup.clear()
+        events = list(self.pending.values())
+        self.pending.clear()
+        return events
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class StockEventHub:
+    """
+    Fans stock events out to subscribers without a thread per subscriber.
+
+    `publish()` may be called from any thread; it schedules a single
+    callback on each event loop that has subscribers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}  # event loop -> set of subscriptions
+
+    def subscribe(self, stock_ids=None, max_pending=1000):
+        loop = asyncio.get_running_loop()
+        subscription = StockSubscription(self, loop, stock_ids, max_pending)
+        with self.lock:
+            self.subscribers.setdefault(loop, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscribers.get(subscription.loop)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscribers[subscription.loop]
+
+    def publish(self, event):
+        with self.lock:
+            loops = list(self.subscribers)
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self.fan_out, loop, event)
+            except RuntimeError:
+                # The loop has been closed; forget its subscribers
+                with self.lock:
+                    self.subscribers.pop(loop, None)
+
+    def fan_out(self, loop, event):
+        with self.lock:
+            subscriptions = list(self.subscribers.get(loop, ()))
+        for subscription in subscriptions:
+            if subscription.wants(event):
+                subscription.push(event)
+
+
+# The hub shared by the whole process
+stock_event_hub = StockEventHub()
+
+
+def publish_stock_level(stock):
+    """
+    Announce the current level of `stock` once the surrounding transaction commits.
+    """
+    event = {
+        'stock_id': str(stock.stock_id),
+        'name': stock.name,
+        'quantity': str(stock_level(stock)),
+        'last_updated': stock.last_updated.isoformat() if stock.last_updated else None,
+    }
+    transaction.on_commit(lambda: stock_event_hub.publish(event))
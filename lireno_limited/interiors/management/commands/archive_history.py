@@ -0,0 +1,46 @@
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from interiors.archive import ARCHIVED_MODELS, archive_rows
+
+
+class Command(BaseCommand):
+    help = "Move purchase and sale history older than a cutoff into the archive tables."
+
+    def add_arguments(self, parser):
+        cutoff = parser.add_mutually_exclusive_group(required=True)
+        cutoff.add_argument('--days', type=int,
+                            help="Archive rows older than this many days.")
+        cutoff.add_argument('--before',
+                            help="Archive rows dated before this date or datetime (ISO 8601).")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of rows moved per transaction.")
+
+    def handle(self, *args, **options):
+        cutoff = self.get_cutoff(options)
+        self.stdout.write(f"Archiving history dated before {cutoff.isoformat()}")
+
+        for model in ARCHIVED_MODELS:
+            moved = archive_rows(model, cutoff, options['batch_size'], progress=self.progress)
+            self.stdout.write(self.style.SUCCESS(
+                f"{model._meta.verbose_name_plural}: {moved} rows archived"))
+
+    def get_cutoff(self, options):
+        if options['days'] is not None:
+            return timezone.now() - timedelta(days=options['days'])
+
+        cutoff = parse_datetime(options['before'])
+        if cutoff is None:
+            date = parse_date(options['before'])
+            if date is None:
+                raise CommandError(f"Invalid --before value: {options['before']}")
+            cutoff = datetime.combine(date, time.min)
+        if timezone.is_naive(cutoff):
+            cutoff = timezone.make_aware(cutoff)
+        return cutoff
+
+    def progress(self, model, moved):
+        self.stdout.write(f"  {model._meta.verbose_name_plural}: {moved} rows moved so far")
@@ -0,0 +1,84 @@
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+
+from interiors.counters import InsufficientStock, enable_sharding, move_stock, stock_level
+from interiors.models import SaleItem, Stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure sale throughput of concurrent writers on a single hot stock, "
+        "with and without sharded counters."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16,
+                            help="Number of concurrent writers.")
+        parser.add_argument('--sales', type=int, default=200,
+                            help="Number of sales attempted by each writer.")
+        parser.add_argument('--shards', type=int, default=8,
+                            help="Number of shards for the sharded run.")
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['sales'] < 1:
+            raise CommandError("--threads and --sales must be positive.")
+        for sharded in (False, True):
+            self.run(sharded, options)
+
+    def run(self, sharded, options):
+        threads, sales = options['threads'], options['sales']
+        # Enough stock for every attempted sale, so refusals mean a bug
+        initial = Decimal(threads * sales)
+        stock = Stock.objects.create(name=f'bench-hot-{uuid.uuid4()}', quantity=initial)
+        if sharded:
+            stock = enable_sharding(stock, options['shards'])
+
+        counts = {'sold': 0, 'refused': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def writer():
+            try:
+                for _ in range(sales):
+                    try:
+                        # Stock movement and sale row commit together
+                        with transaction.atomic():
+                            # Each sale re-reads the stock, as the sale endpoint does
+                            current = Stock.objects.get(pk=stock.pk)
+                            move_stock(current, -1, check_available=True)
+                            SaleItem.objects.create(stock=current, quantity=1, perprice=Decimal('1450.00'))
+                        outcome = 'sold'
+                    except InsufficientStock:
+                        outcome = 'refused'
+                    except DatabaseError:
+                        outcome = 'errors'
+                    with lock:
+                        counts[outcome] += 1
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=writer) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        stock.refresh_from_db()
+        level = stock_level(stock)
+        expected = initial - counts['sold']
+        label = f"sharded ({options['shards']})" if sharded else "single row"
+        self.stdout.write(
+            f"{label:<12} {counts['sold'] / elapsed:8.0f} sales/s  "
+            f"sold {counts['sold']}, refused {counts['refused']}, errors {counts['errors']}"
+        )
+        style = self.style.SUCCESS if level == expected else self.style.ERROR
+        self.stdout.write(style(f"{'':<12} final quantity {level}, expected {expected}"))
+
+        # Removes the scratch stock with its shards and sales
+        stock.delete()
@@ -0,0 +1,101 @@
+import time
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.utils import timezone
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from interiors.middleware import brotli
+from interiors.models import Category, Product, SaleItem, Stock
+from interiors.renderers import MessagePackRenderer, ORJSONRenderer, msgpack, orjson
+from interiors.serializers import ProductSerializer, SaleItemSerializer
+
+
+class Command(BaseCommand):
+    help = "Benchmark encode throughput of the API renderers on sale and product payloads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000,
+                            help="Number of rows in each payload.")
+        parser.add_argument('--iterations', type=int, default=50,
+                            help="Number of times each payload is encoded.")
+        parser.add_argument('--use-db', action='store_true',
+                            help="Serialize existing rows instead of generated ones.")
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+        request = Request(RequestFactory().get('/api/', HTTP_HOST=host))
+
+        if options['use_db']:
+            sales = list(SaleItem.objects.select_related('stock').order_by('-date')[:rows])
+            products = list(Product.objects.select_related('created_by').order_by('created_at')[:rows])
+        else:
+            sales, products = self.build_rows(rows)
+
+        payloads = {
+            'sales': SaleItemSerializer(sales, many=True, context={'request': request}).data,
+            'products': ProductSerializer(products, many=True, context={'request': request}).data,
+        }
+
+        renderers = [('drf-json', JSONRenderer())]
+        if orjson is not None:
+            renderers.append(('orjson', ORJSONRenderer()))
+        if msgpack is not None:
+            renderers.append(('msgpack', MessagePackRenderer()))
+
+        for name, results in payloads.items():
+            # Wrap rows the same way PageNumberPagination does
+            data = {'count': len(results), 'next': None, 'previous': None, 'results': results}
+            self.stdout.write(f"\n{name}: {len(results)} rows")
+            for label, renderer in renderers:
+                self.bench(label, renderer, data, options['iterations'])
+
+    def build_rows(self, rows):
+        """
+        Build unsaved model instances shaped like real shop data.
+        """
+        now = timezone.now()
+        user = User(id=1, username='shopkeeper')
+        category = Category(category_name='Curtains')
+        stocks = [Stock(name=f'Fabric roll {i}', quantity=Decimal('120.00')) for i in range(20)]
+
+        sales = [
+            SaleItem(
+                sale_id=uuid.uuid4(), stock=stocks[i % len(stocks)],
+                quantity=Decimal(i % 7 + 1), perprice=Decimal('1450.50'),
+                discount=Decimal('5.00'), totalprice=Decimal('9645.83'), date=now,
+            )
+            for i in range(rows)
+        ]
+        products = [
+            Product(
+                product_id=uuid.uuid4(), product_name=f'Blackout curtain {i}',
+                description='Lined blackout curtain with eyelet heading, 2.4m drop.',
+                price=Decimal('3899.00'), category=category, created_by=user,
+                created_at=now, updated_at=now,
+            )
+            for i in range(rows)
+        ]
+        return sales, products
+
+    def bench(self, label, renderer, data, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            content = renderer.render(data)
+        elapsed = time.perf_counter() - start
+
+        sizes = f"raw {len(content)}B, gzip {len(compress_string(content))}B"
+        if brotli is not None:
+            sizes += f", br {len(brotli.compress(content, quality=5))}B"
+        megabytes = len(content) * iterations / elapsed / 1_000_000
+        self.stdout.write(
+            f"  {label:<10} {elapsed / iterations * 1000:8.2f} ms/encode "
+            f"{megabytes:8.1f} MB/s  ({sizes})"
+        )
@@ -0,0 +1,126 @@
+import time
+import uuid
+from decimal import Decimal
+
+from django.apps.registry import Apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, models, transaction
+from django.utils import timezone
+
+from interiors.uuids import uuid7
+
+# Scratch models live in their own registry so they never reach migrations
+bench_apps = Apps()
+
+
+def bench_model(name):
+    """
+    Build a throwaway model shaped like SaleItem with a UUID primary key.
+    """
+    attrs = {
+        '__module__': __name__,
+        'id': models.UUIDField(primary_key=True),
+        'stock_id': models.UUIDField(),
+        'quantity': models.DecimalField(max_digits=10, decimal_places=2),
+        'totalprice': models.DecimalField(max_digits=10, decimal_places=2),
+        'date': models.DateTimeField(),
+        'Meta': type('Meta', (), {
+            'app_label': 'interiors', 'apps': bench_apps,
+            'db_table': f'interiors_bench_{name}',
+        }),
+    }
+    return type(f'Bench{name.title()}', (models.Model,), attrs)
+
+
+class Command(BaseCommand):
+    help = "Compare insert throughput and primary key index size of uuid4 and uuid7 keys."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000,
+                            help="Number of rows inserted per key type.")
+        parser.add_argument('--batch-size', type=int, default=10_000,
+                            help="Number of rows inserted per transaction.")
+        parser.add_argument('--database', default='default',
+                            help="Database to run the benchmark in.")
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        for name, generate in (('uuid4', uuid.uuid4), ('uuid7', uuid7)):
+            model = bench_model(name)
+            with connection.schema_editor() as editor:
+                editor.create_model(model)
+            try:
+                elapsed, last_batch = self.insert(connection, model, generate, options)
+                index_size = self.index_size(connection, model)
+            finally:
+                with connection.schema_editor() as editor:
+                    editor.delete_model(model)
+
+            size = f"{index_size / 1_000_000:.1f} MB" if index_size else "n/a"
+            self.stdout.write(
+                f"{name}: {options['rows'] / elapsed:10.0f} rows/s overall, "
+                f"{options['batch_size'] / last_batch:10.0f} rows/s in the last batch, "
+                f"primary key index {size}"
+            )
+
+    def insert(self, connection, model, generate, options):
+        fields = model._meta.concrete_fields
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        placeholders = ', '.join(['%s'] * len(fields))
+        sql = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
+
+        stock_ids = [uuid.uuid4() for _ in range(50)]
+        now = timezone.now()
+        rows, batch_size = options['rows'], options['batch_size']
+        if rows < 1 or batch_size < 1:
+            raise CommandError("--rows and --batch-size must be positive.")
+
+        start = time.perf_counter()
+        last_batch = 0.0
+        for offset in range(0, rows, batch_size):
+            count = min(batch_size, rows - offset)
+            instances = [
+                model(id=generate(), stock_id=stock_ids[i % len(stock_ids)],
+                      quantity=Decimal(2), totalprice=Decimal('2900.00'), date=now)
+                for i in range(count)
+            ]
+            values = [
+                [field.get_db_prep_save(getattr(instance, field.attname), connection)
+                 for field in fields]
+                for instance in instances
+            ]
+            batch_start = time.perf_counter()
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                cursor.executemany(sql, values)
+            last_batch = time.perf_counter() - batch_start
+        return time.perf_counter() - start, last_batch
+
+    def index_size(self, connection, model):
+        """
+        Return the size in bytes of the primary key index, where the backend can tell.
+        """
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT pg_relation_size(indexrelid) FROM pg_index "
+                    "WHERE indrelid = %s::regclass AND indisprimary", [table])
+            elif connection.vendor == 'sqlite':
+                # Needs SQLite built with the dbstat virtual table
+                try:
+                    cursor.execute(
+                        "SELECT SUM(pgsize) FROM dbstat WHERE name = "
+                        "(SELECT name FROM sqlite_master WHERE type = 'index' "
+                        "AND tbl_name = %s AND name LIKE 'sqlite_autoindex%%')", [table])
+                except Exception:
+                    return None
+            elif connection.vendor == 'mysql':
+                # InnoDB clusters rows on the primary key, so report the table itself
+                cursor.execute(
+                    "SELECT data_length FROM information_schema.tables "
+                    "WHERE table_schema = DATABASE() AND table_name = %s", [table])
+            else:
+                return None
+            row = cursor.fetchone()
+        return row[0] if row else None
@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from interiors.models import ArchivedSaleItem, SaleItem, SalesDailyBucket
+from interiors.timeseries import rollup_days
+
+
+class Command(BaseCommand):
+    help = "Roll completed days of sales up into the daily buckets used by the time-series API."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2,
+                            help="Recompute this many days before today (default: 2).")
+        parser.add_argument('--all', action='store_true',
+                            help="Recompute every day since the first sale (implied on the first run).")
+
+    def handle(self, *args, **options):
+        # Today is still open, so the rollup always stops at yesterday
+        last_day = timezone.localdate() - timedelta(days=1)
+
+        # The time-series API assumes every day up to the latest bucket is
+        # rolled up, so the first rollup always starts at the first sale
+        rolled_up_through = SalesDailyBucket.objects.aggregate(day=Max('day'))['day']
+
+        if options['all'] or rolled_up_through is None:
+            first_dates = [
+                model.objects.aggregate(first=Min('date'))['first']
+                for model in (SaleItem, ArchivedSaleItem)
+            ]
+            first_dates = [date for date in first_dates if date is not None]
+            if not first_dates:
+                self.stdout.write("No sales to roll up.")
+                return
+            first_day = timezone.localdate(min(first_dates))
+        else:
+            if options['days'] < 1:
+                raise CommandError("--days must be at least 1.")
+            first_day = last_day - timedelta(days=options['days'] - 1)
+            # Never leave a gap after the previous rollup
+            first_day = min(first_day, rolled_up_through + timedelta(days=1))
+
+        if first_day > last_day:
+            self.stdout.write("Nothing to roll up.")
+            return
+
+        written = rollup_days(first_day, last_day)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {first_day} to {last_day}: {written} buckets written"))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from interiors.models import SYNCED_MODELS, SyncChange
+
+
+class Command(BaseCommand):
+    help = (
+        "Add a change-log entry for every synced object that has none yet, "
+        "so `?since=0` returns objects created before delta sync existed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of entries written per query.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model in SYNCED_MODELS:
+            logged = set(
+                SyncChange.objects.filter(model=model._meta.model_name)
+                .values_list('object_id', flat=True)
+            )
+            missing = [
+                pk for pk in model.objects.values_list('pk', flat=True).iterator()
+                if pk not in logged
+            ]
+            for start in range(0, len(missing), batch_size):
+                SyncChange.record(model, missing[start:start + batch_size])
+            self.stdout.write(self.style.SUCCESS(
+                f"{model._meta.verbose_name_plural}: {len(missing)} entries added"))
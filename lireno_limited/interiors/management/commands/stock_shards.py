@@ -0,0 +1,49 @@
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from interiors.counters import compact_stock, disable_sharding, enable_sharding
+from interiors.models import Stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Enable or disable sharded counters for hot stocks, or compact the "
+        "shards of every sharded stock (run this periodically)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['enable', 'disable', 'compact'])
+        parser.add_argument('stocks', nargs='*',
+                            help="Stock IDs or names; compact defaults to every sharded stock.")
+        parser.add_argument('--shards', type=int,
+                            help="Number of shards for enable (default: STOCK_COUNTER_SHARDS).")
+
+    def handle(self, *args, **options):
+        action = options['action']
+        stocks = [self.get_stock(value) for value in options['stocks']]
+        if not stocks:
+            if action != 'compact':
+                raise CommandError(f"Name at least one stock to {action}.")
+            stocks = Stock.objects.filter(sharded=True)
+        if options['shards'] is not None and options['shards'] < 1:
+            raise CommandError("--shards must be at least 1.")
+
+        for stock in stocks:
+            if action == 'enable':
+                stock = enable_sharding(stock, options['shards'])
+            elif action == 'disable':
+                stock = disable_sharding(stock)
+            else:
+                stock = compact_stock(stock)
+            self.stdout.write(self.style.SUCCESS(f"{action}: {stock}"))
+
+    def get_stock(self, value):
+        try:
+            lookup = {'stock_id': uuid.UUID(value)}
+        except ValueError:
+            lookup = {'name': value}
+        try:
+            return Stock.objects.get(**lookup)
+        except Stock.DoesNotExist:
+            raise CommandError(f"No stock with ID or name {value!r}.")
@@ -0,0 +1,351 @@
+import json
+import logging
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from interiors.counters import stock_level
+from interiors.models import (
+    ArchivedPurchaseItem, ArchivedSaleItem, PurchaseItem, SaleItem, SalesDailyBucket, Stock, Supplier,
+)
+
+# Error messages that mean the database gave up waiting on a lock
+LOCK_ERRORS = ('locked', 'deadlock', 'lock wait', 'could not serialize', 'timeout', 'timed out')
+
+
+def percentile(values, fraction):
+    """
+    Return the nearest-rank percentile of sorted `values`.
+    """
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(fraction * len(values)) - 1))
+    return values[index]
+
+
+class TestClientTransport:
+    """
+    Sends requests through Django's test client, one client per thread.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.local = threading.local()
+
+    def request(self, method, path, data=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client()
+            client.force_login(self.user)
+        body = json.dumps(data) if data is not None else None
+        response = client.generic(method, path, body or '', content_type='application/json',
+                                  HTTP_HOST='localhost')
+        try:
+            payload = response.json() if response.content else None
+        except ValueError:
+            payload = None
+        return response.status_code, payload
+
+    def close(self):
+        connection.close()
+
+
+class HTTPTransport:
+    """
+    Sends requests over HTTP to a running server, authenticated with a token.
+    """
+
+    def __init__(self, base_url, token, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+
+    def request(self, method, path, data=None):
+        request = urllib.request.Request(
+            self.base_url + path, method=method,
+            data=json.dumps(data).encode() if data is not None else None,
+            headers={'Authorization': f'Token {self.token}', 'Content-Type': 'application/json',
+                     'Accept': 'application/json'},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status, content = response.status, response.read()
+        except urllib.error.HTTPError as exc:
+            status, content = exc.code, exc.read()
+        try:
+            payload = json.loads(content) if content else None
+        except ValueError:
+            payload = None
+        return status, payload
+
+    def close(self):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent create/update/delete calls at /api/sales/ and /api/purchases/, "
+        "report throughput, latency and lock errors, then check the quantity of each "
+        "scratch stock the run created against its purchases minus sales."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8,
+                            help="Number of concurrent client threads.")
+        parser.add_argument('--requests', type=int, default=200,
+                            help="Number of requests sent by each worker.")
+        parser.add_argument('--mix', default='create=60,update=25,delete=15',
+                            help="Relative weights of create, update and delete calls.")
+        parser.add_argument('--sales-share', type=float, default=0.5,
+                            help="Fraction of calls sent to /api/sales/ rather than /api/purchases/.")
+        parser.add_argument('--stocks', type=int, default=3,
+                            help="Number of scratch stocks the calls are spread over.")
+        parser.add_argument('--initial-quantity', type=int, default=500,
+                            help="Quantity purchased into each scratch stock before the run.")
+        target = parser.add_mutually_exclusive_group()
+        target.add_argument('--url',
+                            help="Base URL of a running server, e.g. http://127.0.0.1:8000.")
+        target.add_argument('--serve', action='store_true',
+                            help="Start a local runserver for the run and send requests over HTTP.")
+        parser.add_argument('--port', type=int, default=8765,
+                            help="Port for --serve.")
+        parser.add_argument('--timeout', type=float, default=30,
+                            help="HTTP request timeout in seconds.")
+        parser.add_argument('--keep', action='store_true',
+                            help="Keep the scratch stocks, purchases, sales, supplier and harness user afterwards.")
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options['mix'])
+        if options['workers'] < 1 or options['requests'] < 1 or options['stocks'] < 1:
+            raise CommandError("--workers, --requests and --stocks must be positive.")
+
+        user, _ = User.objects.get_or_create(username='stress-harness')
+        token, _ = Token.objects.get_or_create(user=user)
+        supplier = Supplier.objects.create(supplier_name='Stress harness supplier')
+        run_id = uuid.uuid4().hex[:8]
+        stocks = []
+
+        server = None
+        try:
+            stocks.extend(
+                Stock.objects.create(name=f'stress-{run_id}-{index}', quantity=0)
+                for index in range(options['stocks'])
+            )
+            if options['serve']:
+                server = self.start_server(options['port'])
+                transport = HTTPTransport(f"http://127.0.0.1:{options['port']}", token.key, options['timeout'])
+            elif options['url']:
+                transport = HTTPTransport(options['url'], token.key, options['timeout'])
+            else:
+                transport = TestClientTransport(user)
+
+            # Stock the scratch stocks through the purchase endpoint so the
+            # ground truth below needs no starting balance
+            for stock in stocks:
+                status, payload = transport.request('POST', '/api/purchases/', {
+                    'stock': str(stock.pk), 'supplier': str(supplier.pk),
+                    'quantity': options['initial_quantity'], 'perprice': '100.00',
+                })
+                if status != 201:
+                    raise CommandError(f"Seeding purchase failed with {status}: {payload}")
+
+            results = self.run(transport, stocks, supplier, mix, options)
+            self.report(results)
+            mismatches = self.check_stocks(stocks)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+            # Also after a failed or interrupted run, so nothing is left in
+            # the database the harness was pointed at
+            if not options['keep']:
+                # Deleting the stocks cascades to their purchases and sales,
+                # deleting the user to its token
+                stock_ids = [stock.pk for stock in stocks]
+                # Rolled-up sales do not cascade, so a refreshed day could be left behind
+                SalesDailyBucket.objects.filter(stock_id__in=stock_ids).delete()
+                Stock.objects.filter(pk__in=stock_ids).delete()
+                supplier.delete()
+                user.delete()
+
+        if mismatches:
+            raise CommandError(f"{mismatches} stock(s) do not match purchases minus sales.")
+
+    def parse_mix(self, value):
+        mix = {}
+        for part in value.split(','):
+            name, _, weight = part.partition('=')
+            name = name.strip()
+            if name not in ('create', 'update', 'delete'):
+                raise CommandError(f"Unknown call type in --mix: {name!r}")
+            try:
+                mix[name] = float(weight)
+            except ValueError:
+                raise CommandError(f"Invalid weight in --mix: {part!r}")
+        if not any(mix.values()):
+            raise CommandError("--mix needs at least one positive weight.")
+        return mix
+
+    def start_server(self, port):
+        server = subprocess.Popen(
+            [sys.executable, 'manage.py', 'runserver', '--noreload', f'127.0.0.1:{port}'],
+            cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return server
+            except OSError:
+                if server.poll() is not None:
+                    break
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f"The local server did not start on port {port}.")
+
+    def run(self, transport, stocks, supplier, mix, options):
+        calls, weights = list(mix), list(mix.values())
+        # Items created during the run, shared so workers also touch each other's rows
+        created = {'sales': [], 'purchases': []}
+        created_lock = threading.Lock()
+        latencies = defaultdict(list)
+        outcomes = Counter()
+        results_lock = threading.Lock()
+
+        def body(endpoint, stock):
+            data = {'stock': str(stock.pk), 'quantity': random.randint(1, 5), 'perprice': '100.00'}
+            if endpoint == 'purchases':
+                data['supplier'] = str(supplier.pk)
+            else:
+                data['discount'] = '0'
+            return data
+
+        def worker():
+            try:
+                for _ in range(options['requests']):
+                    endpoint = 'sales' if random.random() < options['sales_share'] else 'purchases'
+                    call = random.choices(calls, weights)[0]
+                    with created_lock:
+                        items = created[endpoint]
+                        item = random.choice(items) if items and call != 'create' else None
+                        if call == 'delete' and item is not None:
+                            items.remove(item)
+                    if item is None:
+                        call = 'create'
+
+                    if call == 'create':
+                        method, path, data = 'POST', f'/api/{endpoint}/', body(endpoint, random.choice(stocks))
+                    elif call == 'update':
+                        method, path, data = 'PUT', f'/api/{endpoint}/{item[0]}/', body(endpoint, item[1])
+                    else:
+                        method, path, data = 'DELETE', f'/api/{endpoint}/{item[0]}/', None
+
+                    start = time.perf_counter()
+                    try:
+                        status, payload = transport.request(method, path, data)
+                        outcome = self.classify(status, payload)
+                    except Exception as exc:
+                        status, payload = None, None
+                        message = str(exc).lower()
+                        outcome = 'lock/timeout' if any(text in message for text in LOCK_ERRORS) else 'exception'
+                    elapsed = time.perf_counter() - start
+
+                    if call == 'create' and status == 201:
+                        item_id = payload.get('sale_id') or payload.get('purchase_id')
+                        stock = next(stock for stock in stocks if str(stock.pk) == payload['stock'])
+                        with created_lock:
+                            created[endpoint].append((item_id, stock))
+                    with results_lock:
+                        latencies[f'{call} {endpoint}'].append(elapsed)
+                        outcomes[outcome] += 1
+            finally:
+                transport.close()
+
+        # Failed calls are counted below; keep their tracebacks out of the report
+        request_logger = logging.getLogger('django.request')
+        log_level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+
+        workers = [threading.Thread(target=worker) for _ in range(options['workers'])]
+        start = time.perf_counter()
+        try:
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+        finally:
+            request_logger.setLevel(log_level)
+        return {'elapsed': time.perf_counter() - start, 'latencies': latencies, 'outcomes': outcomes}
+
+    def classify(self, status, payload):
+        if 200 <= status < 300:
+            return 'ok'
+        text = json.dumps(payload).lower() if payload is not None else ''
+        if status >= 500 and any(message in text for message in LOCK_ERRORS):
+            return 'lock/timeout'
+        if status >= 500:
+            return 'server error'
+        return f'rejected ({status})'
+
+    def report(self, results):
+        total = sum(results['outcomes'].values())
+        self.stdout.write(
+            f"\n{total} calls in {results['elapsed']:.2f}s: "
+            f"{total / results['elapsed']:.1f} calls/s"
+        )
+        for outcome, count in results['outcomes'].most_common():
+            self.stdout.write(f"  {outcome:<16} {count}")
+
+        self.stdout.write(f"\n{'call':<20} {'count':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for name, values in sorted(results['latencies'].items()):
+            values.sort()
+            self.stdout.write(
+                f"{name:<20} {len(values):>6} "
+                + ' '.join(f"{percentile(values, fraction) * 1000:>9.1f}" for fraction in (0.5, 0.9, 0.99, 1.0))
+            )
+
+    def check_stocks(self, stocks):
+        """
+        Compare the quantity of each of the run's `stocks` with its purchases
+        minus sales, hot and archived rows included. Other stocks may have
+        been created with an opening quantity that no purchase accounts for,
+        so they are left out. Returns the number of mismatching stocks.
+        """
+        stock_ids = [stock.pk for stock in stocks]
+        truth = defaultdict(Decimal)
+        for model, sign in ((PurchaseItem, 1), (ArchivedPurchaseItem, 1), (SaleItem, -1), (ArchivedSaleItem, -1)):
+            rows = model.objects.filter(stock_id__in=stock_ids).values('stock_id').annotate(total=Sum('quantity'))
+            for row in rows:
+                truth[row['stock_id']] += sign * row['total']
+
+        mismatches = 0
+        self.stdout.write("\nStock consistency (quantity vs purchases - sales):")
+        for stock in Stock.objects.filter(pk__in=stock_ids).order_by('name'):
+            quantity, expected = stock_level(stock), truth[stock.pk]
+            if quantity != expected:
+                mismatches += 1
+                self.stdout.write(self.style.ERROR(
+                    f"  {stock.name}: quantity {quantity}, expected {expected} "
+                    f"(off by {quantity - expected})"))
+        checked = len(stock_ids)
+        if mismatches:
+            self.stdout.write(self.style.ERROR(f"  {mismatches} of {checked} stocks inconsistent"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"  all {checked} stocks consistent"))
+        return mismatches
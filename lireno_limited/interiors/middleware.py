@@ -0,0 +1,97 @@
+# Response compression negotiated from the client's Accept-Encoding header
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.regex_helper import _lazy_re_compile
+from django.utils.text import compress_string
+
+# brotli is optional; without it we only ever offer gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Matches one "coding;q=value" entry of an Accept-Encoding header
+re_accept_encoding = _lazy_re_compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*$')
+
+
+def parse_accept_encoding(header):
+    """
+    Return a dict mapping each coding in an Accept-Encoding header to its q-value.
+    """
+    codings = {}
+    for part in header.split(','):
+        match = re_accept_encoding.match(part)
+        if not match:
+            continue
+        coding, quality = match.groups()
+        try:
+            codings[coding.lower()] = float(quality) if quality else 1.0
+        except ValueError:
+            continue
+    return codings
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with brotli or gzip, whichever the client prefers.
+    """
+    # Payloads smaller than this gain nothing from compression
+    min_length = 200
+    # Preference order used to break ties between equal q-values
+    codings = ('br', 'gzip') if brotli else ('gzip',)
+    # Streaming responses (e.g. server-sent events) must not be buffered
+    skip_content_types = ('text/event-stream',)
+    # Random padding of the gzip header, as Django's GZipMiddleware adds,
+    # to mitigate the BREACH attack on pages that carry a CSRF token
+    max_random_bytes = 100
+
+    def choose_coding(self, request):
+        accepted = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        codings = self.codings
+        if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+            # The body may contain a CSRF token and brotli has no padding
+            # like gzip's, so only offer gzip
+            codings = ('gzip',)
+        best, best_quality = None, 0.0
+        for coding in codings:
+            quality = accepted.get(coding, accepted.get('*', 0.0))
+            if quality > best_quality:
+                best, best_quality = coding, quality
+        return best
+
+    def compress(self, coding, content):
+        if coding == 'br':
+            # Quality 5 gives most of brotli's size win at a fraction of the cost
+            return brotli.compress(content, quality=5)
+        return compress_string(content, max_random_bytes=self.max_random_bytes)
+
+    def process_response(self, request, response):
+        # Every response varies on Accept-Encoding, compressed or not
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if response.get('Content-Type', '').startswith(self.skip_content_types):
+            return response
+        if len(response.content) < self.min_length:
+            return response
+
+        coding = self.choose_coding(request)
+        if coding is None:
+            return response
+
+        compressed_content = self.compress(coding, response.content)
+        # Return the uncompressed body if compressing did not make it smaller
+        if len(compressed_content) >= len(response.content):
+            return response
+
+        response.content = compressed_content
+        response.headers['Content-Length'] = str(len(response.content))
+
+        # The body changed, so a strong ETag no longer matches it byte for byte
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+
+        response.headers['Content-Encoding'] = coding
+        return response
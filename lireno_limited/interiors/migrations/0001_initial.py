@@ -0,0 +1,138 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:24
+
+import django.db.models.deletion
+import interiors.uuids
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('category_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('category_name', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Stock',
+            fields=[
+                ('stock_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('quantity', models.DecimalField(decimal_places=2, default=1, max_digits=10)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Supplier',
+            fields=[
+                ('supplier_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('supplier_name', models.CharField(max_length=255)),
+                ('supplier_email', models.EmailField(blank=True, max_length=254, null=True, unique=True)),
+                ('phone_number', models.CharField(blank=True, max_length=15)),
+                ('address', models.CharField(blank=True, max_length=255, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Product',
+            fields=[
+                ('product_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('product_name', models.CharField(max_length=255)),
+                ('image', models.ImageField(blank=True, null=True, upload_to='products/')),
+                ('description', models.TextField(blank=True, null=True)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='products', to='interiors.category')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='products', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SaleItem',
+            fields=[
+                ('sale_id', models.UUIDField(default=interiors.uuids.uuid7, editable=False, primary_key=True, serialize=False)),
+                ('quantity', models.DecimalField(decimal_places=2, default=1, max_digits=10)),
+                ('perprice', models.DecimalField(decimal_places=2, default=1, max_digits=10)),
+                ('discount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('totalprice', models.DecimalField(decimal_places=2, default=1, max_digits=10)),
+                ('date', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales', to='interiors.stock')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedSaleItem',
+            fields=[
+                ('sale_id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('perprice', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('discount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('totalprice', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('date', models.DateTimeField(db_index=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('stock', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_sales', to='interiors.stock')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PurchaseItem',
+            fields=[
+                ('purchase_id', models.UUIDField(default=interiors.uuids.uuid7, editable=False, primary_key=True, serialize=False)),
+                ('quantity', models.DecimalField(decimal_places=2, default=1, max_digits=10)),
+                ('perprice', models.DecimalField(decimal_places=2, default=1, max_digits=10)),
+                ('totalprice', models.DecimalField(decimal_places=2, default=1, max_digits=10)),
+                ('date', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purchases', to='interiors.stock')),
+                ('supplier', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='purchases', to='interiors.supplier')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedPurchaseItem',
+            fields=[
+                ('purchase_id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('perprice', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('totalprice', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('date', models.DateTimeField(db_index=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('stock', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_purchases', to='interiors.stock')),
+                ('supplier', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_purchases', to='interiors.supplier')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(max_length=32)),
+                ('object_id', models.UUIDField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model', 'seq'], name='sync_change_model_seq'), models.Index(fields=['model', 'object_id'], name='sync_change_model_object')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesDailyBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('sales', models.PositiveIntegerField(default=0)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='interiors.stock')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'stock'), name='unique_sales_bucket_day_stock')],
+            },
+        ),
+    ]
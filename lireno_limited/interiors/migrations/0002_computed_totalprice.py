@@ -0,0 +1,92 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:24
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Round
+
+PURCHASE_TOTAL = Round(F('quantity') * F('perprice'), 2)
+SALE_TOTAL = Round(F('quantity') * F('perprice') * (1 - F('discount') * Decimal('0.01')), 2)
+
+
+def check_stored_totals(apps, schema_editor):
+    """
+    Refuse to drop the stored totals while any of them differs from what the
+    generated column will compute, unless `RECOMPUTE_STORED_TOTALS` is set.
+    """
+    mismatches = []
+    for model_name, expression in (('PurchaseItem', PURCHASE_TOTAL), ('SaleItem', SALE_TOTAL)):
+        model = apps.get_model('interiors', model_name)
+        differing = (
+            model.objects.using(schema_editor.connection.alias)
+            .annotate(computed=expression)
+            .exclude(totalprice=F('computed'))
+        )
+        count = differing.count()
+        if count:
+            sample = ', '.join(str(pk) for pk in differing.values_list('pk', flat=True)[:5])
+            mismatches.append(f"{count} {model_name} rows (e.g. {sample})")
+
+    if mismatches and not getattr(settings, 'RECOMPUTE_STORED_TOTALS', False):
+        raise RuntimeError(
+            "Stored totalprice values differ from the computed ones for "
+            + "; ".join(mismatches)
+            + ". Review them (archiving old history keeps its stored totals), then set "
+            "RECOMPUTE_STORED_TOTALS = True to replace them and run the migration again."
+        )
+
+
+def restore_stored_totals(apps, schema_editor):
+    # Unapplying re-adds the plain columns filled with their default
+    for model_name, expression in (('PurchaseItem', PURCHASE_TOTAL), ('SaleItem', SALE_TOTAL)):
+        model = apps.get_model('interiors', model_name)
+        model.objects.using(schema_editor.connection.alias).update(totalprice=expression)
+
+
+class Migration(migrations.Migration):
+    """
+    Turn `totalprice` of purchase and sale items into stored generated
+    columns. A plain column cannot be altered into a generated one, so the
+    old column is dropped and re-added; the database computes the value of
+    every existing row while adding it.
+
+    The values of a generated column can only be written by the database,
+    so they cannot be backfilled in batches. On PostgreSQL adding it rewrites
+    the whole table under an ACCESS EXCLUSIVE lock, blocking reads and writes
+    of the table until it finishes: run it in a maintenance window, and
+    consider `manage.py archive_history` first to shrink the hot tables.
+
+    Before anything is dropped, the stored totals are compared with the new
+    expression. They may differ where Django rounded a half cent to even
+    while the database rounds it away from zero, or where quantities and
+    prices were changed with queryset updates that never recomputed the
+    total; the migration stops instead of silently replacing them.
+    """
+
+    dependencies = [
+        ('interiors', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_stored_totals, restore_stored_totals),
+        migrations.RemoveField(
+            model_name='purchaseitem',
+            name='totalprice',
+        ),
+        migrations.AddField(
+            model_name='purchaseitem',
+            name='totalprice',
+            field=models.GeneratedField(db_persist=True, expression=PURCHASE_TOTAL, output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+        migrations.RemoveField(
+            model_name='saleitem',
+            name='totalprice',
+        ),
+        migrations.AddField(
+            model_name='saleitem',
+            name='totalprice',
+            field=models.GeneratedField(db_persist=True, expression=SALE_TOTAL, output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interiors', '0002_computed_totalprice'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
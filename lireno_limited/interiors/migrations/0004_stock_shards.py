@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interiors', '0003_product_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='sharded',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='StockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='interiors.stock')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('stock', 'shard'), name='unique_stock_shard')],
+            },
+        ),
+    ]
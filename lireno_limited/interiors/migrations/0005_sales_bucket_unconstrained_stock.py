@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interiors', '0004_stock_shards'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='salesdailybucket',
+            name='stock',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='daily_sales', to='interiors.stock'),
+        ),
+    ]
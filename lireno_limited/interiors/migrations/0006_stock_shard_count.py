@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:46
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def count_existing_shards(apps, schema_editor):
+    # Stocks sharded before the count was stored keep the rows they have
+    Stock = apps.get_model('interiors', 'Stock')
+    db = schema_editor.connection.alias
+    for stock in Stock.objects.using(db).filter(sharded=True).annotate(last_shard=Max('shards__shard')):
+        if stock.last_shard is not None:
+            stock.shard_count = stock.last_shard + 1
+            stock.save(update_fields=['shard_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interiors', '0005_sales_bucket_unconstrained_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='shard_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing_shards, migrations.RunPython.noop),
+    ]
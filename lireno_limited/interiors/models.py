@@ -1,10 +1,13 @@
 import uuid
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Round
 from decimal import Decimal
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from rest_framework.authtoken.models import Token
 from django.conf import settings
+from .uuids import uuid7
 
 
 
@@ -27,7 +30,7 @@ class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='products')
     created_by = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='products')
     is_active = models.BooleanField(default=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)  # Admin date filter
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
@@ -50,46 +53,194 @@ class Stock(models.Model):
     name = models.CharField(max_length=255, unique=True, null=False)
     quantity = models.DecimalField(max_digits=10, decimal_places=2, default=1)
     last_updated = models.DateTimeField(auto_now=True)
+    # Hot stocks can spread their quantity over `StockShard` rows so that
+    # concurrent sales do not all wait on this row; `quantity` is then only
+    # a snapshot refreshed by compaction (see `interiors.counters`)
+    sharded = models.BooleanField(default=False)
+    # Number of `StockShard` rows of a sharded stock, fixed when sharding is
+    # enabled and independent of later changes to STOCK_COUNTER_SHARDS
+    shard_count = models.PositiveSmallIntegerField(default=0)
 
     def __str__(self):
-        return f"{self.name} - {self.quantity}"
+        if not self.sharded:
+            return f"{self.name} - {self.quantity}"
+        # The live level of a sharded stock takes a query, so it is only
+        # shown where the queryset annotated it (see StockAdmin)
+        if getattr(self, 'shard_total', None) is not None:
+            return f"{self.name} - {self.shard_total}"
+        return self.name
+
+
+class StockShard(models.Model):
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='shards')
+    shard = models.PositiveSmallIntegerField()
+    quantity = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['stock', 'shard'], name='unique_stock_shard'),
+        ]
+
+    def __str__(self):
+        return f"{self.stock_id} shard {self.shard} - {self.quantity}"
 
 
 class PurchaseItem(models.Model):
-    purchase_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Time-ordered ids keep inserts at the end of the primary key index;
+    # rows created earlier keep their random uuid4 ids, both are valid UUIDs
+    purchase_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='purchases')
     supplier = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True, related_name='purchases')
     quantity = models.DecimalField(max_digits=10, decimal_places=2, default=1)
     perprice = models.DecimalField(max_digits=10, decimal_places=2, default=1)
-    totalprice = models.DecimalField(max_digits=10, decimal_places=2, default=1)
-    date = models.DateTimeField(auto_now_add=True)
-
-    def save(self, *args, **kwargs):
-        self.totalprice = self.quantity * self.perprice
-        super().save(*args, **kwargs)
+    # Computed and stored by the database, so bulk writes and queryset
+    # updates of quantity or price keep it correct too
+    totalprice = models.GeneratedField(
+        expression=Round(F('quantity') * F('perprice'), 2),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
+    date = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
         return f"Purchase {self.purchase_id}"
 
 
 class SaleItem(models.Model):
-    sale_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Time-ordered ids, see PurchaseItem.purchase_id
+    sale_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='sales')
     quantity = models.DecimalField(max_digits=10, decimal_places=2, default=1)
     perprice = models.DecimalField(max_digits=10, decimal_places=2, default=1)
     discount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
-    totalprice = models.DecimalField(max_digits=10, decimal_places=2, default=1)
-    date = models.DateTimeField(auto_now_add=True)
-
-    def save(self, *args, **kwargs):
-        discounted_price = self.perprice * (Decimal(1) - self.discount / Decimal(100))
-        self.totalprice = self.quantity * discounted_price
-        super().save(*args, **kwargs)
+    # Computed and stored by the database, see PurchaseItem.totalprice
+    totalprice = models.GeneratedField(
+        expression=Round(F('quantity') * F('perprice') * (1 - F('discount') * Decimal('0.01')), 2),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
+    date = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
         return f"Sale {self.sale_id}"
 
 
+# Archive tables for aged history, filled by `interiors.archive`.
+# They keep the original ids and values and are never recalculated. The
+# foreign keys carry no database constraint so the tables can live in a
+# separate database (see `ARCHIVE_DATABASE`), and deleting a stock or
+# supplier leaves the archived history untouched.
+class ArchivedPurchaseItem(models.Model):
+    purchase_id = models.UUIDField(primary_key=True, editable=False)
+    stock = models.ForeignKey(Stock, on_delete=models.DO_NOTHING, db_constraint=False, related_name='archived_purchases')
+    supplier = models.ForeignKey(Supplier, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='archived_purchases')
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    perprice = models.DecimalField(max_digits=10, decimal_places=2)
+    totalprice = models.DecimalField(max_digits=10, decimal_places=2)
+    date = models.DateTimeField(db_index=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived purchase {self.purchase_id}"
+
+
+class ArchivedSaleItem(models.Model):
+    sale_id = models.UUIDField(primary_key=True, editable=False)
+    stock = models.ForeignKey(Stock, on_delete=models.DO_NOTHING, db_constraint=False, related_name='archived_sales')
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    perprice = models.DecimalField(max_digits=10, decimal_places=2)
+    discount = models.DecimalField(max_digits=10, decimal_places=2)
+    totalprice = models.DecimalField(max_digits=10, decimal_places=2)
+    date = models.DateTimeField(db_index=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived sale {self.sale_id}"
+
+
+# Pre-aggregated daily sales per stock, hot and archived rows together.
+# Filled by `rollup_sales` and used by the time-series API for long ranges.
+# Like the archive tables, the stock key has no database constraint: archived
+# sales of deleted stocks still roll up, and their history is kept.
+class SalesDailyBucket(models.Model):
+    day = models.DateField()
+    stock = models.ForeignKey(Stock, on_delete=models.DO_NOTHING, db_constraint=False, related_name='daily_sales')
+    quantity = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    sales = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'stock'], name='unique_sales_bucket_day_stock'),
+        ]
+
+    def __str__(self):
+        return f"{self.stock_id} on {self.day}"
+
+
+# Change log behind the `?since=` delta-sync feeds. `seq` is a monotonic
+# sequence; each object keeps only its latest entry, and deletes stay
+# behind as tombstones (`deleted=True`).
+class SyncChange(models.Model):
+    seq = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=32)
+    object_id = models.UUIDField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'seq'], name='sync_change_model_seq'),
+            models.Index(fields=['model', 'object_id'], name='sync_change_model_object'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} @ {self.seq}"
+
+    @classmethod
+    def record(cls, model, object_ids, deleted=False, replace=True):
+        """
+        Append a change for each id, replacing earlier entries of the same
+        objects unless `replace` is false (the feeds keep the latest entry).
+        """
+        label = model._meta.model_name
+        object_ids = list(object_ids)
+        if not object_ids:
+            return
+        with transaction.atomic():
+            if replace:
+                cls.objects.filter(model=label, object_id__in=object_ids).delete()
+            cls.objects.bulk_create(
+                [cls(model=label, object_id=object_id, deleted=deleted) for object_id in object_ids])
+
+
+# Models whose changes are published through the delta-sync feeds
+SYNCED_MODELS = (Category, Product, Stock)
+
+
+def record_sync_change(sender, instance=None, raw=False, **kwargs):
+    if not raw:
+        SyncChange.record(sender, [instance.pk])
+
+
+def record_sync_tombstone(sender, instance=None, **kwargs):
+    SyncChange.record(sender, [instance.pk], deleted=True)
+
+
+# Connected per model: a post_delete receiver without a sender would make
+# Django give up fast (single query) deletes for every other model
+for synced_model in SYNCED_MODELS:
+    post_save.connect(record_sync_change, sender=synced_model)
+    post_delete.connect(record_sync_tombstone, sender=synced_model)
+
+
+@receiver(pre_delete, sender=Category)
+def record_category_products_change(sender, instance=None, **kwargs):
+    # Deleting a category nulls its products' category with a plain UPDATE,
+    # which sends no signals of its own
+    SyncChange.record(Product, instance.products.values_list('pk', flat=True))
+
+
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_auth_token(sender, instance=None, created=False, **kwargs):
     if created:
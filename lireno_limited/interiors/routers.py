@@ -0,0 +1,36 @@
+from django.conf import settings
+
+
+class ArchiveRouter:
+    """
+    Sends the archive tables to the database named by `ARCHIVE_DATABASE`
+    and keeps every other model out of it when that is a separate database.
+    """
+    archive_models = {'archivedpurchaseitem', 'archivedsaleitem'}
+
+    def is_archive(self, model_name):
+        return model_name in self.archive_models
+
+    def archive_db(self):
+        return getattr(settings, 'ARCHIVE_DATABASE', 'default')
+
+    def db_for_read(self, model, **hints):
+        if self.is_archive(model._meta.model_name):
+            return self.archive_db()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_read(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Archive rows point at stocks and suppliers without a constraint
+        if self.is_archive(obj1._meta.model_name) or self.is_archive(obj2._meta.model_name):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if model_name is None or self.archive_db() == 'default':
+            return None
+        if self.is_archive(model_name):
+            return db == self.archive_db()
+        return db != self.archive_db()
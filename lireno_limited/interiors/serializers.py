@@ -1,7 +1,8 @@
 # Import necessary modules and models
 from rest_framework import serializers
-from .models import Category, Product, Supplier, Stock, PurchaseItem, SaleItem
+from .models import Category, Product, Supplier, Stock, PurchaseItem, SaleItem, ArchivedPurchaseItem, ArchivedSaleItem
 from django.contrib.auth.models import User
+from .counters import set_stock_level, stock_level
 
 # Serializer for User Model
 
@@ -146,6 +147,10 @@ class StockSerializer(serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Stock  # Specifies the model to serialize
         fields = '__all__'  # Serializes all fields
+        extra_kwargs = {
+            'sharded': {'read_only': True},  # Managed with `manage.py stock_shards`
+            'shard_count': {'read_only': True},
+        }
 
     def create(self, validated_data):
         return Stock.objects.create(**validated_data)
@@ -154,9 +159,19 @@ class StockSerializer(serializers.HyperlinkedModelSerializer):
         # Updates stock details
         instance.name = validated_data.get('name', instance.name)
         instance.quantity = validated_data.get('quantity', instance.quantity)
+        # A sharded stock's quantity lives in its shards
+        if instance.sharded and 'quantity' in validated_data:
+            set_stock_level(instance, instance.quantity)
         instance.save()
         return instance
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Report the live total rather than the last compacted snapshot
+        if instance.sharded:
+            data['quantity'] = self.fields['quantity'].to_representation(stock_level(instance))
+        return data
+
 # Serializer for PurchaseItem Model
 
 
@@ -177,13 +192,14 @@ class PurchaseItemSerializer(serializers.HyperlinkedModelSerializer):
         read_only=True  # Cannot be modified
     )
 
+    # Computed by the database. Declared explicitly because DRF maps a
+    # GeneratedField to a plain ModelField that would not render as a string.
+    totalprice = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
     class Meta:
         model = PurchaseItem  # Specifies the model to serialize
         fields = ['purchase_url', 'purchase_id', 'stock',
                   'supplier', 'quantity', 'perprice', 'totalprice', 'date']
-        extra_kwargs = {
-            'totalprice': {'read_only': True}  # Automatically calculated
-        }
 
     def create(self, validated_data):
         return PurchaseItem.objects.create(**validated_data)
@@ -195,6 +211,8 @@ class PurchaseItemSerializer(serializers.HyperlinkedModelSerializer):
         instance.quantity = validated_data.get('quantity', instance.quantity)
         instance.perprice = validated_data.get('perprice', instance.perprice)
         instance.save()
+        # Reload the total the database recomputed on save
+        instance.refresh_from_db(fields=['totalprice'])
         return instance
 
 # Serializer for SaleItem Model
@@ -212,13 +230,13 @@ class SaleItemSerializer(serializers.HyperlinkedModelSerializer):
         read_only=True  # Cannot be modified
     )
 
+    # Computed by the database, see PurchaseItemSerializer.totalprice
+    totalprice = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
     class Meta:
         model = SaleItem  # Specifies the model to serialize
         fields = ['sale_url', 'sale_id', 'stock', 'quantity',
-                  'perprice', 'discount', 'date']
-        extra_kwargs = {
-            'totalprice': {'read_only': True}  # Automatically calculated
-        }
+                  'perprice', 'discount', 'totalprice', 'date']
 
     def create(self, validated_data):
         return SaleItem.objects.create(**validated_data)
@@ -230,4 +248,33 @@ class SaleItemSerializer(serializers.HyperlinkedModelSerializer):
         instance.perprice = validated_data.get('perprice', instance.perprice)
         instance.discount = validated_data.get('discount', instance.discount)
         instance.save()
+        # Reload the total the database recomputed on save
+        instance.refresh_from_db(fields=['totalprice'])
         return instance
+
+# Serializers for archived history, which is read-only
+
+
+class ArchivedPurchaseItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedPurchaseItem
+        fields = ['purchase_id', 'stock', 'supplier', 'quantity',
+                  'perprice', 'totalprice', 'date', 'archived_at']
+        read_only_fields = fields
+
+
+class ArchivedSaleItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedSaleItem
+        fields = ['sale_id', 'stock', 'quantity', 'perprice',
+                  'discount', 'totalprice', 'date', 'archived_at']
+        read_only_fields = fields
+
+# Serializer for one point of the sales time series
+
+
+class SalesTimeSeriesPointSerializer(serializers.Serializer):
+    bucket = serializers.DateTimeField()  # Start of the bucket
+    quantity = serializers.DecimalField(max_digits=16, decimal_places=2)
+    revenue = serializers.DecimalField(max_digits=18, decimal_places=2)
+    sales = serializers.IntegerField()  # Number of sale items in the bucket
@@ -0,0 +1,49 @@
+# Delta-sync change feeds built on the `SyncChange` log
+from datetime import timedelta
+
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import SyncChange
+
+# Maximum number of log entries returned by one feed request
+SYNC_BATCH_SIZE = 500
+
+# Entries younger than this may still have lower-numbered neighbours in
+# transactions that have not committed yet, so the returned token stops
+# before them and they are sent again on the next sync.
+SYNC_SETTLE_TIME = timedelta(seconds=5)
+
+
+def changes_since(model, since, batch_size=SYNC_BATCH_SIZE):
+    """
+    Return `(changed_ids, deleted_ids, next_token, has_more)` for changes to
+    `model` recorded after the `since` token.
+    """
+    label = model._meta.model_name
+    # Only the latest entry of each object, so objects with many appended
+    # entries (sharded stocks, see `interiors.counters`) take one slot
+    superseded = SyncChange.objects.filter(model=label, object_id=OuterRef('object_id'), seq__gt=OuterRef('seq'))
+    entries = list(
+        SyncChange.objects.filter(model=label, seq__gt=since)
+        .exclude(Exists(superseded))
+        .order_by('seq')
+        .values_list('seq', 'object_id', 'deleted', 'changed_at')[:batch_size + 1]
+    )
+    has_more = len(entries) > batch_size
+    entries = entries[:batch_size]
+
+    settled_before = timezone.now() - SYNC_SETTLE_TIME
+    next_token, settled = since, True
+    changed, deleted = {}, {}
+    for seq, object_id, is_deleted, changed_at in entries:
+        settled = settled and changed_at < settled_before
+        if settled:
+            next_token = seq
+        # The latest entry of an object wins
+        changed.pop(object_id, None)
+        deleted.pop(object_id, None)
+        (deleted if is_deleted else changed)[object_id] = seq
+
+    # Only ask for an immediate follow-up if this batch could be consumed whole
+    return list(changed), list(deleted), next_token, has_more and settled
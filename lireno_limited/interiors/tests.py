@@ -1,3 +1,451 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import gzip
+import json
+import uuid
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from . import uuids
+from .archive import archive_rows
+from .counters import (
+    InsufficientStock, compact_stock, disable_sharding, enable_sharding, move_stock, split_evenly, stock_level,
+)
+from .events import StockEventHub, StockSubscription
+from .middleware import CompressionMiddleware
+from .models import (
+    ArchivedPurchaseItem, ArchivedSaleItem, Category, PurchaseItem, SaleItem, SalesDailyBucket, Stock, StockShard,
+    SyncChange,
+)
+from .renderers import ORJSONRenderer, orjson
+from .serializers import PurchaseItemSerializer, SaleItemSerializer
+from .sync import changes_since
+from .timeseries import coarsen_interval, rollup_days, sales_timeseries
+
+# A second database for tests that need the archive kept apart from the hot
+# tables. It is registered before the test runner sets databases up, so it
+# gets created and migrated like `default`.
+ARCHIVE_ALIAS = 'archive'
+connections.settings.setdefault(ARCHIVE_ALIAS, {**connections.settings['default'], 'NAME': ':memory:'})
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    def get_response(self, request):
+        return HttpResponse(b'stock ' * 200)
+
+    def compress(self, **headers):
+        request = RequestFactory().get('/', **headers)
+        return CompressionMiddleware(self.get_response)(request)
+
+    def test_gzip_header_is_padded(self):
+        # The random filename in the gzip header varies the compressed length
+        lengths = {len(self.compress(HTTP_ACCEPT_ENCODING='gzip').content) for _ in range(20)}
+        self.assertGreater(len(lengths), 1)
+
+    def test_csrf_responses_are_only_gzipped(self):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='br, gzip')
+        request.META['CSRF_COOKIE_NEEDS_UPDATE'] = True
+        response = CompressionMiddleware(self.get_response)(request)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), b'stock ' * 200)
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    def test_utc_datetimes_end_in_z(self):
+        if orjson is None:
+            self.skipTest("orjson is not installed")
+        moment = datetime.datetime(2024, 5, 1, 12, 30, tzinfo=datetime.timezone.utc)
+        self.assertEqual(ORJSONRenderer().render({'start': moment}), b'{"start":"2024-05-01T12:30:00Z"}')
+
+
+@override_settings(ARCHIVE_DATABASE=ARCHIVE_ALIAS)
+class ArchiveRowsTests(TransactionTestCase):
+    databases = {'default', ARCHIVE_ALIAS}
+
+    def setUp(self):
+        self.stock = Stock.objects.create(name='Oak table', quantity=0)
+        self.old = [PurchaseItem.objects.create(stock=self.stock, quantity=2, perprice=10) for _ in range(3)]
+        self.new = PurchaseItem.objects.create(stock=self.stock, quantity=1, perprice=10)
+        self.cutoff = timezone.now() - datetime.timedelta(days=365)
+        PurchaseItem.objects.filter(pk__in=[item.pk for item in self.old]).update(
+            date=self.cutoff - datetime.timedelta(days=30))
+        for item in self.old:
+            item.refresh_from_db()
+
+    def test_moves_aged_rows_to_the_archive_database(self):
+        self.assertEqual(archive_rows(PurchaseItem, self.cutoff, batch_size=2), 3)
+        self.assertEqual(list(PurchaseItem.objects.values_list('pk', flat=True)), [self.new.pk])
+        archived = ArchivedPurchaseItem.objects.using(ARCHIVE_ALIAS)
+        self.assertEqual({row.pk for row in archived}, {item.pk for item in self.old})
+        self.assertEqual({row.totalprice for row in archived}, {Decimal('20.00')})
+        self.assertFalse(ArchivedPurchaseItem.objects.using('default').exists())
+
+    def test_failed_archive_commit_keeps_the_hot_rows(self):
+        with mock.patch.object(connections[ARCHIVE_ALIAS], 'commit', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                archive_rows(PurchaseItem, self.cutoff)
+        self.assertEqual(PurchaseItem.objects.count(), 4)
+        self.assertFalse(ArchivedPurchaseItem.objects.using(ARCHIVE_ALIAS).exists())
+
+    def test_rerun_after_a_copied_batch_is_harmless(self):
+        # A crash after the archive commit but before the delete leaves the
+        # batch in both tables; the next run must still finish the move
+        ArchivedPurchaseItem.objects.using(ARCHIVE_ALIAS).create(
+            purchase_id=self.old[0].pk, stock_id=self.stock.pk, quantity=2, perprice=10,
+            totalprice=20, date=self.old[0].date)
+        self.assertEqual(archive_rows(PurchaseItem, self.cutoff), 3)
+        self.assertEqual(PurchaseItem.objects.count(), 1)
+        self.assertEqual(ArchivedPurchaseItem.objects.using(ARCHIVE_ALIAS).count(), 3)
+
+
+class TimeSeriesTests(TestCase):
+    start = datetime.datetime(2018, 1, 1, tzinfo=datetime.timezone.utc)
+
+    def test_coarsen_interval(self):
+        week = self.start + datetime.timedelta(days=7)
+        self.assertEqual(coarsen_interval('hour', self.start, week, 500), 'hour')
+        self.assertEqual(coarsen_interval('hour', self.start, week, 7), 'day')
+        self.assertEqual(coarsen_interval('day', self.start, week, 1), 'week')
+        seven_years = self.start + datetime.timedelta(days=7 * 365)
+        self.assertEqual(coarsen_interval('day', self.start, seven_years, 30), 'quarter')
+        self.assertEqual(coarsen_interval('day', self.start, seven_years, 5), 'year')
+
+    def test_point_cap_holds_for_long_ranges(self):
+        stock = Stock.objects.create(name='Walnut shelf', quantity=0)
+        # One archived sale in each of 82 months
+        ArchivedSaleItem.objects.bulk_create([
+            ArchivedSaleItem(sale_id=uuid.uuid4(), stock=stock, quantity=1, perprice=10, discount=0,
+                             totalprice=10, date=self.start + datetime.timedelta(days=30 * month + 1))
+            for month in range(82)
+        ])
+        end = self.start + datetime.timedelta(days=7 * 365)
+        interval, step, points = sales_timeseries('day', self.start, end, max_points=5)
+        self.assertEqual(interval, 'year')
+        self.assertEqual(step, 2)
+        self.assertLessEqual(len(points), 5)
+        self.assertEqual(sum(point['sales'] for point in points), 82)
+        self.assertEqual(sum(point['revenue'] for point in points), Decimal('820'))
+
+        interval, step, points = sales_timeseries('day', self.start, end, max_points=1)
+        self.assertEqual(len(points), 1)
+        self.assertEqual(points[0]['bucket'].year, 2018)
+
+    def test_rollup_keeps_history_of_deleted_stocks(self):
+        kept = Stock.objects.create(name='Birch stool', quantity=0)
+        removed = Stock.objects.create(name='Elm cabinet', quantity=0)
+        ArchivedSaleItem.objects.bulk_create([
+            ArchivedSaleItem(sale_id=uuid.uuid4(), stock=stock, quantity=2, perprice=10, discount=0,
+                             totalprice=20, date=self.start + datetime.timedelta(days=day, hours=12))
+            for stock in (kept, removed) for day in range(40)
+        ])
+        removed_id = removed.pk
+        removed.delete()
+        # An archived sale of a stock deleted before the rollup ran
+        ArchivedSaleItem.objects.create(sale_id=uuid.uuid4(), stock_id=uuid.uuid4(), quantity=1, perprice=5,
+                                        discount=0, totalprice=5, date=self.start + datetime.timedelta(hours=12))
+
+        end = self.start + datetime.timedelta(days=40)
+        _, _, raw = sales_timeseries('month', self.start, end)
+        self.assertEqual(rollup_days(self.start.date(), end.date()), 81)
+        self.assertTrue(SalesDailyBucket.objects.filter(stock_id=removed_id).exists())
+
+        Stock.objects.filter(pk=kept.pk).delete()
+        self.assertEqual(SalesDailyBucket.objects.count(), 81)
+        _, _, bucketed = sales_timeseries('month', self.start, end)
+        self.assertEqual(bucketed, raw)
+        self.assertEqual(sum(point['revenue'] for point in bucketed), Decimal('1605'))
+
+
+class SyncChangeTests(TestCase):
+    def settle(self):
+        SyncChange.objects.update(changed_at=timezone.now() - datetime.timedelta(minutes=1))
+
+    def test_changes_and_tombstones(self):
+        kept = Category.objects.create(category_name='Chairs')
+        removed = Category.objects.create(category_name='Lamps')
+        removed_id = removed.pk
+        removed.delete()
+        self.settle()
+
+        changed, deleted, token, has_more = changes_since(Category, 0)
+        self.assertEqual(changed, [kept.pk])
+        self.assertEqual(deleted, [removed_id])
+        self.assertFalse(has_more)
+        self.assertEqual(changes_since(Category, token), ([], [], token, False))
+
+        kept.category_name = 'Armchairs'
+        kept.save()
+        self.settle()
+        changed, deleted, next_token, _ = changes_since(Category, token)
+        self.assertEqual((changed, deleted), ([kept.pk], []))
+        self.assertGreater(next_token, token)
+
+    def test_batches_and_unsettled_entries(self):
+        categories = [Category.objects.create(category_name=f'Range {index}') for index in range(3)]
+        self.settle()
+        changed, _, token, has_more = changes_since(Category, 0, batch_size=2)
+        self.assertEqual(changed, [category.pk for category in categories[:2]])
+        self.assertTrue(has_more)
+
+        # Entries too recent to be final are returned, but the token stops before them
+        fresh = Category.objects.create(category_name='Range 3')
+        changed, _, next_token, has_more = changes_since(Category, token)
+        self.assertEqual(changed, [categories[2].pk, fresh.pk])
+        self.assertEqual(next_token, SyncChange.objects.get(object_id=categories[2].pk).seq)
+        self.assertFalse(has_more)
+
+    def test_unsynced_models_keep_fast_deletes(self):
+        stock = Stock.objects.create(name='Pine bench', quantity=0)
+        SaleItem.objects.create(stock=stock, quantity=1, perprice=10)
+        with self.assertNumQueries(1):
+            SaleItem.objects.filter(stock=stock).delete()
+
+
+class StockSubscriptionTests(SimpleTestCase):
+    def test_push_coalesces_per_stock_and_drops_the_oldest(self):
+        subscription = StockSubscription(StockEventHub(), loop=None, max_pending=2)
+        for stock_id, quantity in (('a', 1), ('b', 2), ('a', 3), ('c', 4)):
+            subscription.push({'stock_id': stock_id, 'quantity': quantity})
+        self.assertEqual(subscription.dropped, 1)
+        events = asyncio.run(subscription.next_events(timeout=0))
+        self.assertEqual(events, [{'stock_id': 'a', 'quantity': 3}, {'stock_id': 'c', 'quantity': 4}])
+        self.assertEqual(asyncio.run(subscription.next_events(timeout=0)), [])
+
+
+class StockEventStreamTests(TransactionTestCase):
+    async def next_frame(self, stream):
+        chunk = await asyncio.wait_for(anext(stream), timeout=5)
+        return chunk.decode() if isinstance(chunk, bytes) else chunk
+
+    async def test_sales_are_streamed_after_commit(self):
+        user = await User.objects.acreate(username='tablet')
+        watched = await Stock.objects.acreate(name='Ash wardrobe', quantity=10)
+        other = await Stock.objects.acreate(name='Yew sideboard', quantity=10)
+        await self.async_client.aforce_login(user)
+        await sync_to_async(self.client.force_login)(user)
+
+        response = await self.async_client.get('/api/stocks/events/', {'stock': str(watched.pk)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        try:
+            # The first frame opens the subscription
+            self.assertEqual(await self.next_frame(stream), 'retry: 5000\n\n')
+
+            sell = sync_to_async(self.client.post)
+            for stock, quantity in ((other, 1), (watched, 2), (watched, 3)):
+                response = await sell('/api/sales/', {
+                    'stock': str(stock.pk), 'quantity': quantity, 'perprice': '10.00', 'discount': '0'})
+                self.assertEqual(response.status_code, 201)
+
+            # Only the watched stock, and only its latest level
+            frame = await self.next_frame(stream)
+            self.assertEqual(frame.count('event: stock\n'), 1)
+            event = json.loads(frame.split('data: ', 1)[1])
+            self.assertEqual(event['stock_id'], str(watched.pk))
+            self.assertEqual(Decimal(event['quantity']), 5)
+        finally:
+            await stream.aclose()
+
+
+class StockEventsTests(TestCase):
+    def test_refused_outside_asgi(self):
+        self.client.force_login(User.objects.create_user('tablet'))
+        response = self.client.get('/api/stocks/events/')
+        self.assertEqual(response.status_code, 501)
+        self.assertFalse(response.streaming)
+
+    def test_requires_authentication(self):
+        self.assertEqual(self.client.get('/api/stocks/events/').status_code, 401)
+
+
+class TotalPriceSerializerTests(TestCase):
+    def test_totals_render_as_strings(self):
+        stock = Stock.objects.create(name='Teak desk', quantity=0)
+        purchase = PurchaseItem.objects.create(stock=stock, quantity=3, perprice='33.33')
+        sale = SaleItem.objects.create(stock=stock, quantity=3, perprice='33.33', discount='12.5')
+        purchase.refresh_from_db()
+        sale.refresh_from_db()
+        context = {'request': RequestFactory().get('/')}
+        for serializer, total in ((PurchaseItemSerializer(purchase, context=context), b'"99.99"'),
+                                  (SaleItemSerializer(sale, context=context), b'"87.49"')):
+            self.assertIn(b'"totalprice":' + total, JSONRenderer().render(serializer.data))
+
+
+class SplitEvenlyTests(SimpleTestCase):
+    def test_whole_cents_with_remainder_first(self):
+        self.assertEqual(split_evenly(Decimal('10.00'), 3), [Decimal('3.34'), Decimal('3.33'), Decimal('3.33')])
+        self.assertEqual(split_evenly(Decimal('0.05'), 8), [Decimal('0.05')] + [Decimal('0.00')] * 7)
+
+    def test_negative_total_stays_on_one_shard(self):
+        # Spreading a debt would leave every shard negative
+        self.assertEqual(split_evenly(Decimal('-7'), 4), [Decimal('-7')] + [Decimal(0)] * 3)
+
+
+@override_settings(STOCK_COUNTER_SHARDS=4)
+class ShardedStockTests(TestCase):
+    def setUp(self):
+        self.stock = enable_sharding(Stock.objects.create(name='Cedar chest', quantity=100))
+
+    def shard_quantities(self):
+        return list(StockShard.objects.filter(stock=self.stock).order_by('shard').values_list('quantity', flat=True))
+
+    def test_enable_spreads_quantity_over_shards(self):
+        self.assertTrue(self.stock.sharded)
+        self.assertEqual(self.shard_quantities(), [Decimal(25)] * 4)
+        self.assertEqual(stock_level(self.stock), 100)
+
+    def test_str_runs_no_queries(self):
+        move_stock(self.stock, -30, check_available=True)
+        self.assertEqual(self.stock.quantity, 100)  # Snapshot until compacted
+        with self.assertNumQueries(0):
+            self.assertEqual(str(self.stock), 'Cedar chest')
+
+    def test_sale_changelist_query_count_does_not_grow_with_sharded_stocks(self):
+        self.client.force_login(User.objects.create_superuser('admin'))
+        stocks = [self.stock] + [
+            enable_sharding(Stock.objects.create(name=f'Cedar chest {index}', quantity=10)) for index in range(4)]
+        SaleItem.objects.bulk_create([SaleItem(stock=stock, quantity=1, perprice=10) for stock in stocks * 4])
+        with self.assertNumQueries(4):
+            response = self.client.get('/admin/interiors/saleitem/')
+        self.assertContains(response, 'Cedar chest 3')
+
+    def test_fast_path_takes_from_a_single_shard(self):
+        move_stock(self.stock, -10, check_available=True)
+        self.assertEqual(sorted(self.shard_quantities()), [Decimal(15)] + [Decimal(25)] * 3)
+        self.assertEqual(stock_level(self.stock), 90)
+
+    def test_locking_path_takes_across_shards(self):
+        move_stock(self.stock, -60, check_available=True)
+        self.assertEqual(stock_level(self.stock), 40)
+        self.assertEqual(self.shard_quantities(), [Decimal(10)] * 4)
+
+    def test_checked_movement_never_goes_below_zero(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            move_stock(self.stock, -101, check_available=True)
+        self.assertEqual(raised.exception.available, 100)
+        self.assertEqual(stock_level(self.stock), 100)
+
+        move_stock(self.stock, -100, check_available=True)
+        self.assertEqual(stock_level(self.stock), 0)
+
+    def test_shard_in_debt_forces_the_locking_path(self):
+        # An unchecked movement can leave one shard negative; single shards
+        # then overstate what is available
+        move_stock(self.stock, -90)
+        self.assertEqual(stock_level(self.stock), 10)
+        with self.assertRaises(InsufficientStock):
+            move_stock(self.stock, -20, check_available=True)
+        self.assertEqual(stock_level(self.stock), 10)
+
+    def test_shard_count_is_fixed_when_enabled(self):
+        self.assertEqual(self.stock.shard_count, 4)
+        stock = enable_sharding(Stock.objects.create(name='Maple crib', quantity=100), 2)
+        self.assertEqual(stock.shard_count, 2)
+        # Movements use the stock's own shards, not the (larger) setting
+        with override_settings(STOCK_COUNTER_SHARDS=8):
+            for _ in range(20):
+                move_stock(stock, 1)
+            for _ in range(20):
+                move_stock(stock, -2, check_available=True)
+        self.assertEqual(stock_level(stock), 80)
+
+    def test_missing_shard_row_falls_back_to_locking(self):
+        StockShard.objects.filter(stock=self.stock, shard=3).delete()
+        for _ in range(10):
+            move_stock(self.stock, 1)
+        self.assertEqual(stock_level(self.stock), 85)
+        self.assertEqual(disable_sharding(self.stock).shard_count, 0)
+
+    def test_additions_land_on_one_shard(self):
+        move_stock(self.stock, 5)
+        self.assertEqual(sorted(self.shard_quantities()), [Decimal(25)] * 3 + [Decimal(30)])
+
+    def test_movements_reach_the_sync_feed(self):
+        SyncChange.objects.all().delete()
+        move_stock(self.stock, -30, check_available=True)
+        move_stock(self.stock, 5)
+        SyncChange.objects.update(changed_at=timezone.now() - datetime.timedelta(minutes=1))
+        changed, _, _, _ = changes_since(Stock, 0)
+        self.assertEqual(changed, [self.stock.pk])
+
+        # Compaction saves the stock, which prunes the appended entries
+        compact_stock(self.stock)
+        self.assertEqual(SyncChange.objects.filter(object_id=self.stock.pk).count(), 1)
+
+    def test_sale_on_sharded_stock_reaches_tablets(self):
+        self.client.force_login(User.objects.create_user('tablet'))
+        SyncChange.objects.update(changed_at=timezone.now() - datetime.timedelta(minutes=1))
+        token = self.client.get('/api/stocks/', {'since': 0}).json()['next']
+
+        response = self.client.post('/api/sales/', {
+            'stock': str(self.stock.pk), 'quantity': 30, 'perprice': '10.00', 'discount': '0'})
+        self.assertEqual(response.status_code, 201)
+        changed = self.client.get('/api/stocks/', {'since': token}).json()['changed']
+        self.assertEqual([(row['name'], Decimal(row['quantity'])) for row in changed],
+                         [('Cedar chest', Decimal(70))])
+
+    def test_admin_lists_the_live_level(self):
+        self.client.force_login(User.objects.create_superuser('admin'))
+        move_stock(self.stock, -30, check_available=True)
+        response = self.client.get('/admin/interiors/stock/')
+        self.assertContains(response, '<td class="field-current_quantity">70')
+
+    def test_many_movements_take_one_feed_entry(self):
+        SyncChange.objects.all().delete()
+        other = Stock.objects.create(name='Spruce rack', quantity=0)
+        for _ in range(50):
+            move_stock(self.stock, -1, check_available=True)
+        SyncChange.objects.update(changed_at=timezone.now() - datetime.timedelta(minutes=1))
+        changed, _, token, has_more = changes_since(Stock, 0, batch_size=2)
+        self.assertEqual(changed, [other.pk, self.stock.pk])
+        self.assertFalse(has_more)
+        self.assertEqual(changes_since(Stock, token), ([], [], token, False))
+
+    def test_compact_rebalances_and_refreshes_snapshot(self):
+        move_stock(self.stock, -20, check_available=True)
+        stock = compact_stock(self.stock)
+        self.assertEqual(stock.quantity, 80)
+        self.assertEqual(self.shard_quantities(), [Decimal(20)] * 4)
+
+    def test_disable_folds_shards_back(self):
+        move_stock(self.stock, -30, check_available=True)
+        stock = disable_sharding(self.stock)
+        self.assertFalse(stock.sharded)
+        self.assertEqual(stock.quantity, 70)
+        self.assertFalse(StockShard.objects.filter(stock=stock).exists())
+        self.assertEqual(enable_sharding(stock, 2).quantity, 70)
+        self.assertEqual(stock_level(stock), 70)
+
+
+class UUID7Tests(SimpleTestCase):
+    now_ms = 1_760_000_000_123
+
+    def frozen_ids(self, count):
+        # A stopped clock puts every id in the same millisecond
+        with mock.patch.object(uuids, '_last_timestamp', 0), \
+                mock.patch.object(uuids.time, 'time_ns', return_value=self.now_ms * 1_000_000):
+            return [uuids.uuid7() for _ in range(count)]
+
+    def test_version_variant_and_timestamp(self):
+        value = self.frozen_ids(1)[0]
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, uuid.RFC_4122)
+        self.assertEqual(value.int >> 80, self.now_ms)
+
+    def test_strictly_increasing_within_a_millisecond(self):
+        # More than the 12-bit counter holds, so it overflows at least once
+        values = self.frozen_ids(0x1000 + 10)
+        self.assertTrue(all(a.int < b.int for a, b in zip(values, values[1:])))
+        timestamps = [value.int >> 80 for value in values]
+        self.assertEqual(timestamps[0], self.now_ms)
+        # Overflowing borrows the next millisecond rather than wrapping around
+        self.assertEqual(timestamps[-1], self.now_ms + 1)
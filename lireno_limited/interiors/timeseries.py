@@ -0,0 +1,185 @@
+# Time-bucketed sales aggregation for the dashboards
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from math import ceil
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate, TruncDay, TruncHour, TruncMonth, TruncQuarter, TruncWeek, TruncYear
+from django.utils import timezone
+
+from .models import ArchivedSaleItem, SaleItem, SalesDailyBucket
+
+# Truncation functions per interval, coarsest last
+INTERVALS = {
+    'hour': TruncHour,
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'quarter': TruncQuarter,
+    'year': TruncYear,
+}
+
+# Approximate bucket length, used to estimate how many points a range yields
+INTERVAL_LENGTHS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+    'month': timedelta(days=30),
+    'quarter': timedelta(days=91),
+    'year': timedelta(days=365),
+}
+
+# Ranges with at least this many whole rolled-up days read the daily buckets
+BUCKET_MIN_DAYS = 31
+
+
+def coarsen_interval(interval, start, end, max_points):
+    """
+    Return the finest interval, no finer than `interval`, that keeps the
+    number of points between `start` and `end` within `max_points`.
+    """
+    names = list(INTERVALS)
+    for name in names[names.index(interval):]:
+        if (end - start) / INTERVAL_LENGTHS[name] <= max_points:
+            return name
+    return names[-1]
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _add(points, bucket, quantity, revenue, sales):
+    point = points.setdefault(bucket, [Decimal(0), Decimal(0), 0])
+    point[0] += quantity or 0
+    point[1] += revenue or 0
+    point[2] += sales
+
+
+def _aggregate_raw(points, interval, start, end, stock_ids):
+    """
+    Add hot and archived sales dated in [start, end) to `points`.
+    """
+    if start >= end:
+        return
+    for model in (SaleItem, ArchivedSaleItem):
+        queryset = model.objects.filter(date__gte=start, date__lt=end)
+        if stock_ids:
+            queryset = queryset.filter(stock_id__in=stock_ids)
+        rows = (
+            queryset.annotate(bucket=INTERVALS[interval]('date'))
+            .values('bucket')
+            .annotate(quantity=Sum('quantity'), revenue=Sum('totalprice'), sales=Count('pk'))
+        )
+        for row in rows:
+            _add(points, row['bucket'], row['quantity'], row['revenue'], row['sales'])
+
+
+def _aggregate_buckets(points, interval, first_day, last_day, stock_ids):
+    """
+    Add the rolled-up daily buckets from `first_day` to `last_day` to `points`.
+    """
+    queryset = SalesDailyBucket.objects.filter(day__gte=first_day, day__lte=last_day)
+    if stock_ids:
+        queryset = queryset.filter(stock_id__in=stock_ids)
+    rows = (
+        queryset.annotate(bucket=INTERVALS[interval]('day'))
+        .values('bucket')
+        .annotate(quantity=Sum('quantity'), revenue=Sum('revenue'), sales=Sum('sales'))
+    )
+    for row in rows:
+        _add(points, _start_of_day(row['bucket']), row['quantity'], row['revenue'], row['sales'])
+
+
+def sales_timeseries(interval, start, end, stock_ids=None, max_points=500):
+    """
+    Return `(interval, step, points)` for sales dated in [start, end).
+
+    `interval` may come back coarser than requested so that no more than
+    `max_points` points are returned. Should even yearly points be too many,
+    runs of `step` consecutive points are merged into one, dated by the first
+    of them, so the cap holds whatever the range. Whole days already rolled up into
+    `SalesDailyBucket` are read from there when the range is long enough;
+    the remaining edges are aggregated from the sale tables directly.
+    """
+    interval = coarsen_interval(interval, start, end, max_points)
+    points = {}
+
+    rolled_up_through = SalesDailyBucket.objects.aggregate(day=Max('day'))['day']
+    first_day = timezone.localdate(start)
+    if _start_of_day(first_day) < start:
+        first_day += timedelta(days=1)
+    last_day = timezone.localdate(end) - timedelta(days=1)
+    if rolled_up_through is not None:
+        last_day = min(last_day, rolled_up_through)
+
+    if (interval != 'hour' and rolled_up_through is not None
+            and (last_day - first_day).days + 1 >= BUCKET_MIN_DAYS):
+        bucket_start = _start_of_day(first_day)
+        bucket_end = _start_of_day(last_day + timedelta(days=1))
+        _aggregate_raw(points, interval, start, bucket_start, stock_ids)
+        _aggregate_buckets(points, interval, first_day, last_day, stock_ids)
+        _aggregate_raw(points, interval, bucket_end, end, stock_ids)
+    else:
+        _aggregate_raw(points, interval, start, end, stock_ids)
+
+    # Edge buckets are truncated in the database, the daily buckets in
+    # Python, so normalise both to the current timezone before merging.
+    merged = {}
+    for bucket, (quantity, revenue, sales) in points.items():
+        if isinstance(bucket, datetime):
+            bucket = timezone.localtime(bucket)
+        _add(merged, bucket, quantity, revenue, sales)
+
+    # Partial edge buckets can still add a point or two to the estimate
+    # behind `coarsen_interval`, and years may be too many on their own
+    step = max(1, ceil(len(merged) / max_points))
+    grouped = {}
+    for index, (bucket, (quantity, revenue, sales)) in enumerate(sorted(merged.items())):
+        if index % step == 0:
+            first = bucket
+        _add(grouped, first, quantity, revenue, sales)
+
+    return interval, step, [
+        {'bucket': bucket, 'quantity': quantity, 'revenue': revenue, 'sales': sales}
+        for bucket, (quantity, revenue, sales) in grouped.items()
+    ]
+
+
+def rollup_days(first_day, last_day):
+    """
+    Recompute the daily buckets from `first_day` to `last_day` inclusive.
+    Returns the number of bucket rows written.
+    """
+    start = _start_of_day(first_day)
+    end = _start_of_day(last_day + timedelta(days=1))
+
+    totals = {}
+    for model in (SaleItem, ArchivedSaleItem):
+        rows = (
+            model.objects.filter(date__gte=start, date__lt=end)
+            .annotate(day=TruncDate('date'))
+            .values('day', 'stock_id')
+            .annotate(quantity=Sum('quantity'), revenue=Sum('totalprice'), sales=Count('pk'))
+        )
+        for row in rows:
+            _add(totals, (row['day'], row['stock_id']), row['quantity'], row['revenue'], row['sales'])
+
+    with transaction.atomic():
+        SalesDailyBucket.objects.filter(day__gte=first_day, day__lte=last_day).delete()
+        SalesDailyBucket.objects.bulk_create([
+            SalesDailyBucket(day=day, stock_id=stock_id, quantity=quantity, revenue=revenue, sales=sales)
+            for (day, stock_id), (quantity, revenue, sales) in totals.items()
+        ])
+    return len(totals)
+
+
+def refresh_day(date):
+    """
+    Recompute the daily buckets for the day of `date` if it was already
+    rolled up, so edits to old sales do not leave the buckets stale.
+    """
+    day = timezone.localdate(date)
+    if SalesDailyBucket.objects.filter(day__gte=day).exists():
+        rollup_days(day, day)
@@ -16,5 +16,7 @@ router.register(r'sales', views.SaLeItemViewSet, basename='sale')
 
 
 urlpatterns = [
+    # Must come before the router, whose stock-detail route would match it
+    path('stocks/events/', views.stock_events, name='stock-events'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -0,0 +1,46 @@
+# Time-ordered UUIDs for insert-heavy tables
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_timestamp = 0
+_counter = 0
+
+
+def uuid7():
+    """
+    Return a version 7 UUID (RFC 9562).
+
+    The first 48 bits are the Unix time in milliseconds, so ids created
+    later sort later and new rows land at the right edge of a B-tree index
+    instead of on random pages. The 12 `rand_a` bits are used as a counter
+    that keeps ids from one process ordered within the same millisecond.
+    """
+    global _last_timestamp, _counter
+
+    with _lock:
+        timestamp = time.time_ns() // 1_000_000
+        if timestamp <= _last_timestamp:
+            # Same millisecond (or the clock went back): keep counting up
+            timestamp = _last_timestamp
+            _counter += 1
+            if _counter > 0xFFF:
+                timestamp += 1
+                _counter = 0
+        else:
+            # Start each millisecond low enough to leave room to count
+            _counter = int.from_bytes(os.urandom(2), 'big') & 0x7FF
+        _last_timestamp = timestamp
+        counter = _counter
+
+    rand_b = int.from_bytes(os.urandom(8), 'big') & 0x3FFF_FFFF_FFFF_FFFF
+    value = (
+        (timestamp & 0xFFFF_FFFF_FFFF) << 80
+        | 0x7 << 76
+        | counter << 64
+        | 0b10 << 62
+        | rand_b
+    )
+    return uuid.UUID(int=value)
@@ -9,9 +9,112 @@ from rest_framework.exceptions import ValidationError
 from django.contrib.auth.models import User
 # Importing viewset and permission classes from DRF
 from rest_framework import permissions, viewsets
-from rest_framework.decorators import api_view  # For defining API views in DRF
+from rest_framework.decorators import action, api_view  # For defining API views in DRF
 # For reversing view names to generate URLs
 from rest_framework.reverse import reverse
+# Helpers for reading archived purchase and sale history
+from .archive import ARCHIVED_MODELS, MergedHistory
+# Database-side sales aggregation for the time-series endpoint
+from .timeseries import INTERVALS, refresh_day, sales_timeseries
+# Change feeds for delta sync
+from .sync import changes_since
+# Broadcast of live stock levels to the server-sent events stream
+from .events import publish_stock_level, stock_event_hub
+# Stock movements, sharded for hot stocks
+from .counters import InsufficientStock, move_stock
+import json
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+# Helpers for parsing the time-series query parameters
+import uuid
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+# Parse `stock` query parameters given as repeated and/or comma separated IDs
+def parse_stock_ids(values):
+    stock_ids = [
+        stock_id for value in values
+        for stock_id in value.split(',') if stock_id
+    ]
+    try:
+        return [str(uuid.UUID(stock_id)) for stock_id in stock_ids]
+    except ValueError:
+        raise ValidationError({"stock": "Enter valid stock IDs."})
+
+
+# Mixin adding an opt-in `?include_archived=true` to list views, which then
+# merges archived rows into the results in `-date` order
+class IncludeArchivedMixin:
+    archived_serializer_class = None
+
+    def include_archived(self):
+        value = self.request.query_params.get('include_archived', '')
+        return value.lower() in ('1', 'true', 'yes')
+
+    def list(self, request, *args, **kwargs):
+        # By default only the hot table is queried
+        if not self.include_archived():
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        archived_model = ARCHIVED_MODELS[queryset.model]
+        history = MergedHistory(queryset, archived_model.objects.all())
+
+        page = self.paginate_queryset(history)
+        rows = page if page is not None else history[:]
+
+        # Serialize each kind in one go, then restore the merged order
+        hot = [row for row in rows if not isinstance(row, archived_model)]
+        cold = [row for row in rows if isinstance(row, archived_model)]
+        hot_data = iter(self.get_serializer(hot, many=True).data)
+        cold_data = iter(self.archived_serializer_class(cold, many=True).data)
+        data = [next(cold_data) if isinstance(row, archived_model) else next(hot_data)
+                for row in rows]
+
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+# Mixin turning `?since=<token>` on list views into a change feed: objects
+# changed after the token, ids of deleted objects and the next token.
+# `?since=0` replays the whole log.
+class DeltaSyncMixin:
+
+    def list(self, request, *args, **kwargs):
+        since = request.query_params.get('since')
+        if since is None:
+            return super().list(request, *args, **kwargs)
+
+        try:
+            since = int(since)
+        except ValueError:
+            raise ValidationError({"since": "Enter a token returned by a previous sync."})
+        if since < 0:
+            raise ValidationError({"since": "Enter a token returned by a previous sync."})
+
+        model = self.get_queryset().model
+        changed_ids, deleted_ids, next_token, has_more = changes_since(model, since)
+
+        # Nothing changed: the log lookup was the only query
+        changed = []
+        if changed_ids:
+            objects = self.get_queryset().filter(pk__in=changed_ids)
+            changed = self.get_serializer(objects, many=True).data
+
+        return Response({
+            'since': str(since),
+            'next': str(next_token),
+            'has_more': has_more,
+            'changed': changed,
+            'deleted': deleted_ids,
+        })
 
 
 # ViewSet for managing User data with read-only access
@@ -29,10 +132,11 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
 
 
 # ViewSet for managing Category data with full CRUD actions
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(DeltaSyncMixin, viewsets.ModelViewSet):
     """
     This viewset automatically provides `list`, `create`,
     `retrieve`, `update` and `destroy` actions for categories.
+    `?since=<token>` lists only the changes after a previous sync.
     """
     queryset = Category.objects.all().order_by(
         'category_name')  # Queryset to fetch all category objects
@@ -42,10 +146,11 @@ class CategoryViewSet(viewsets.ModelViewSet):
 
 
 # ViewSet for managing Product data with full CRUD actions
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(DeltaSyncMixin, viewsets.ModelViewSet):
     """
     This viewset automatically provides `list`, `create`, `retrieve`,
     `update` and `destroy` actions for products.
+    `?since=<token>` lists only the changes after a previous sync.
     """
     queryset = Product.objects.all().order_by(
         'created_at')  # Query all products ordered by 'created_at'
@@ -92,10 +197,11 @@ class SupplierViewSet(viewsets.ModelViewSet):
 
 
 # ViewSet for managing Stock data with full CRUD actions
-class StockViewSet(viewsets.ModelViewSet):
+class StockViewSet(DeltaSyncMixin, viewsets.ModelViewSet):
     """
     This viewset automatically provides `list`, `create`,
     `retrieve`, `update` and `destroy` actions for stocks.
+    `?since=<token>` lists only the changes after a previous sync.
     """
     queryset = Stock.objects.all()  # Fetch all stock records
     serializer_class = StockSerializer  # Stock serializer class
@@ -104,15 +210,18 @@ class StockViewSet(viewsets.ModelViewSet):
 
 
 # ViewSet for managing Purchase Item data with full CRUD actions
-class PurchaseItemViewSet(viewsets.ModelViewSet):
+class PurchaseItemViewSet(IncludeArchivedMixin, viewsets.ModelViewSet):
     """
     This viewset automatically provides `list`, `create`, `retrieve`,
     `update` and `destroy` actions for purchase items.
+    Archived purchases are only listed with `?include_archived=true`.
     """
     queryset = PurchaseItem.objects.all().order_by(
         '-date')  # Order purchases by date in descending order
     # Serializer class for PurchaseItem model
     serializer_class = PurchaseItemSerializer
+    # Serializer for archived rows merged in by `?include_archived=true`
+    archived_serializer_class = ArchivedPurchaseItemSerializer
     # Only authenticated users can perform CRUD actions
     permission_classes = [permissions.IsAuthenticated]
 
@@ -144,8 +253,9 @@ class PurchaseItemViewSet(viewsets.ModelViewSet):
                 {"quantity": "The quantity must be greater than 0."})
 
         # Update stock quantity before saving the purchase item
-        stock.quantity += int(quantity)
-        stock.save()
+        move_stock(stock, int(quantity))
+        # Push the new stock level to live subscribers
+        publish_stock_level(stock)
 
         # Save the PurchaseItem instance after setting related fields
         serializer.save(stock=stock, supplier=supplier)
@@ -180,11 +290,11 @@ class PurchaseItemViewSet(viewsets.ModelViewSet):
 
         # Revert the previous quantity in the stock
         # before updating to the new value
-        stock.quantity -= old_quantity
-        stock.save()
+        move_stock(stock, -old_quantity)
 
-        stock.quantity += int(quantity)
-        stock.save()
+        move_stock(stock, int(quantity))
+        # Push the new stock level to live subscribers
+        publish_stock_level(stock)
 
         # Save the updated PurchaseItem instance
         serializer.save(stock=stock, supplier=supplier)
@@ -194,23 +304,27 @@ class PurchaseItemViewSet(viewsets.ModelViewSet):
     def perform_destroy(self, instance):
         stock = instance.stock  # Retrieve the related stock
         # Update the stock quantity by subtracting the purchased quantity
-        stock.quantity -= instance.quantity
-        stock.save()
+        move_stock(stock, -instance.quantity)
+        # Push the new stock level to live subscribers
+        publish_stock_level(stock)
 
         # Perform the default destroy action
         super().perform_destroy(instance)
 
 
 # ViewSet for managing SaleItem data with full CRUD actions
-class SaLeItemViewSet(viewsets.ModelViewSet):
+class SaLeItemViewSet(IncludeArchivedMixin, viewsets.ModelViewSet):
     """
     This viewset automatically provides `list`, `create`, `retrieve`,
     `update` and `destroy` actions for sale items.
+    Archived sales are only listed with `?include_archived=true`.
     """
     queryset = SaleItem.objects.all().order_by(
         '-date')  # Order sale items by date in descending order
     # Serializer class for SaleItem model
     serializer_class = SaleItemSerializer
+    # Serializer for archived rows merged in by `?include_archived=true`
+    archived_serializer_class = ArchivedSaleItemSerializer
     # Only authenticated users can access
     permission_classes = [permissions.IsAuthenticated]
 
@@ -232,14 +346,15 @@ class SaLeItemViewSet(viewsets.ModelViewSet):
             raise ValidationError(
                 {"quantity": "The quantity must be greater than 0."})
 
-        # Ensure that the sale doesn't exceed available stock quantity
-        if Decimal(quantity) > stock.quantity:
+        # Decrease the stock quantity based on the sold quantity,
+        # ensuring that the sale doesn't exceed the available quantity
+        try:
+            move_stock(stock, -int(quantity), check_available=True)
+        except InsufficientStock as exc:
             raise ValidationError(
-                {"quantity": f"The sale exceeds the current stock quantity of {stock.quantity}."})
-
-        # Decrease the stock quantity based on the sold quantity
-        stock.quantity -= int(quantity)
-        stock.save()
+                {"quantity": f"The sale exceeds the current stock quantity of {exc.available}."})
+        # Push the new stock level to live subscribers
+        publish_stock_level(stock)
 
         # Save the sale item after adjusting the stock
         serializer.save(stock=stock)
@@ -261,23 +376,132 @@ class SaLeItemViewSet(viewsets.ModelViewSet):
         old_quantity = sale_item.quantity  # Get the old sale quantity
 
         # Revert the previous sale quantity before applying the new quantity
-        stock.quantity += old_quantity
-        stock.save()
+        move_stock(stock, old_quantity)
 
         # Subtract the updated sale quantity from the stock
-        stock.quantity -= int(quantity)
-        stock.save()
+        move_stock(stock, -int(quantity))
+        # Push the new stock level to live subscribers
+        publish_stock_level(stock)
 
         # Save the updated SaleItem object
         serializer.save(stock=stock)
 
+        # Keep the rolled-up daily sales of that day in step
+        refresh_day(sale_item.date)
+
     # Custom 'destroy' method for SaleItem to update stock after deletion
     def perform_destroy(self, instance):
         # Retrieve the related stock for the SaleItem
         stock = instance.stock
         # Add back the quantity removed by the sale
-        stock.quantity += instance.quantity
-        stock.save()
+        move_stock(stock, instance.quantity)
+        # Push the new stock level to live subscribers
+        publish_stock_level(stock)
 
         # Perform the default destroy action for SaleItem
         super().perform_destroy(instance)
+
+        # Keep the rolled-up daily sales of that day in step
+        refresh_day(instance.date)
+
+    # Parse a `start`/`end` query parameter given as a date or datetime
+    def parse_timeseries_bound(self, name, default):
+        value = self.request.query_params.get(name)
+        if not value:
+            return default
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValidationError(
+                    {name: "Enter a valid ISO 8601 date or datetime."})
+            moment = datetime.combine(day, time.min)
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
+
+    # Sales volume and revenue bucketed by hour, day, week, month, quarter
+    # or year. Accepts `interval`, `start`, `end`, `stock` (comma separated
+    # IDs) and `max_points`; the interval is coarsened to respect
+    # `max_points`, and `step` says how many intervals each point spans.
+    @action(detail=False, methods=['get'])
+    def timeseries(self, request):
+        interval = request.query_params.get('interval', 'day')
+        if interval not in INTERVALS:
+            raise ValidationError(
+                {"interval": f"Choose one of: {', '.join(INTERVALS)}."})
+
+        end = self.parse_timeseries_bound('end', timezone.now())
+        start = self.parse_timeseries_bound('start', end - timedelta(days=30))
+        if start >= end:
+            raise ValidationError({"start": "The start must be before the end."})
+
+        try:
+            max_points = min(int(request.query_params.get('max_points', 500)), 1000)
+        except ValueError:
+            raise ValidationError({"max_points": "Enter a whole number."})
+        if max_points < 1:
+            raise ValidationError({"max_points": "The number of points must be greater than 0."})
+
+        stock_ids = parse_stock_ids(request.query_params.getlist('stock'))
+
+        interval, step, points = sales_timeseries(interval, start, end, stock_ids, max_points)
+        return Response({
+            'interval': interval,
+            'step': step,
+            'start': start,
+            'end': end,
+            'points': SalesTimeSeriesPointSerializer(points, many=True).data,
+        })
+
+
+# Authenticate a plain Django request with the API's authentication classes
+def get_api_user(request):
+    api_request = Request(request, authenticators=[
+        auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        return api_request.user
+    except APIException:
+        return None
+
+
+# Server-sent events stream of stock-level changes made by the purchase and
+# sale endpoints, optionally limited with `?stock=<id>,<id>`. This is an
+# async view so that, served through `asgi.py`, idle subscribers cost no thread.
+async def stock_events(request):
+    user = await sync_to_async(get_api_user)(request)
+    if user is None or not user.is_authenticated:
+        return HttpResponse(status=401)
+
+    # Under WSGI Django buffers an async iterator to completion, so this
+    # endless stream would hang the request and keep growing in memory
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(
+            json.dumps({"detail": "Live stock events are only served through the ASGI application."}),
+            status=501, content_type='application/json')
+
+    try:
+        stock_ids = parse_stock_ids(request.GET.getlist('stock'))
+    except ValidationError as exc:
+        return HttpResponse(json.dumps(exc.detail), status=400, content_type='application/json')
+
+    async def stream():
+        subscription = stock_event_hub.subscribe(stock_ids)
+        try:
+            # Ask EventSource clients to reconnect after 5 seconds
+            yield 'retry: 5000\n\n'
+            while True:
+                events = await subscription.next_events(timeout=15)
+                if not events:
+                    # Keep proxies from closing an idle connection
+                    yield ': keep-alive\n\n'
+                    continue
+                yield ''.join(
+                    f"event: stock\ndata: {json.dumps(event)}\n\n" for event in events)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable nginx response buffering
+    return response
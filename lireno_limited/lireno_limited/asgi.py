@@ -2,6 +2,8 @@
 ASGI config for lireno_limited project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve the project through it to stream /api/stocks/events/ without holding
+a worker thread per connected client.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/